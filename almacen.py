@@ -0,0 +1,164 @@
+# almacen.py
+import os
+import json
+import time
+import sqlite3
+import threading
+from config import *
+from metricas import metricas
+
+# ==========================================
+# ALMACÉN COMPARTIDO ENTRE RÉPLICAS (CLAVE -> VALOR CON VENCIMIENTO)
+# ==========================================
+class Almacen:
+    """Base común: los backends guardan texto; acá se agrega el prefijo, el JSON y el manejo de errores.
+
+    Si el backend falla se sigue sin él (cuenta como miss): la app nunca depende de que esté arriba.
+    """
+
+    tipo = "?"
+
+    def __init__(self, prefijo=PREFIJO_ALMACEN):
+        self.prefijo = prefijo
+        self.error = None
+
+    def obtener(self, clave):
+        try:
+            valor = self._obtener(self.prefijo + clave)
+            self.error = None
+        except Exception as e:
+            self.error = str(e)
+            metricas().contar("almacen_errores", backend=self.tipo)
+            return None
+        metricas().contar("almacen", resultado="miss" if valor is None else "hit")
+        return None if valor is None else json.loads(valor)
+
+    def guardar(self, clave, valor, ttl=None):
+        try:
+            self._guardar(self.prefijo + clave, json.dumps(valor, ensure_ascii=False, default=str), ttl)
+            self.error = None
+            return True
+        except Exception as e:
+            self.error = str(e)
+            metricas().contar("almacen_errores", backend=self.tipo)
+            return False
+
+    def borrar(self, clave):
+        try: self._borrar(self.prefijo + clave)
+        except Exception as e: self.error = str(e)
+
+    def estado(self):
+        return {"backend": self.tipo, "error": self.error}
+
+class AlmacenMemoria(Almacen):
+    """Solo este proceso (una réplica o pruebas)."""
+
+    tipo = "memoria"
+
+    def __init__(self, **kw):
+        super().__init__(**kw)
+        self._datos = {}  # clave -> (valor, vence)
+        self._lock = threading.Lock()
+
+    def _obtener(self, clave):
+        with self._lock:
+            valor, vence = self._datos.get(clave, (None, None))
+            if vence is not None and vence < time.time():
+                del self._datos[clave]
+                return None
+            return valor
+
+    def _guardar(self, clave, valor, ttl):
+        with self._lock: self._datos[clave] = (valor, time.time() + ttl if ttl else None)
+
+    def _borrar(self, clave):
+        with self._lock: self._datos.pop(clave, None)
+
+class AlmacenSQLite(Almacen):
+    """Archivo SQLite: sobrevive reinicios y lo comparten las réplicas de la misma máquina/volumen."""
+
+    tipo = "sqlite"
+
+    def __init__(self, ruta, **kw):
+        super().__init__(**kw)
+        self.ruta = ruta
+        self._local = threading.local()  # una conexión por hilo
+        self._escrituras = 0
+
+    def _con(self):
+        con = getattr(self._local, "con", None)
+        if con is None:
+            os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+            con = sqlite3.connect(self.ruta, timeout=5)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.execute("CREATE TABLE IF NOT EXISTS almacen (clave TEXT PRIMARY KEY, valor TEXT, vence REAL)")
+            self._local.con = con
+        return con
+
+    def _obtener(self, clave):
+        fila = self._con().execute("SELECT valor, vence FROM almacen WHERE clave = ?", (clave,)).fetchone()
+        if fila is None or (fila[1] is not None and fila[1] < time.time()): return None
+        return fila[0]
+
+    def _guardar(self, clave, valor, ttl):
+        con = self._con()
+        with con: con.execute("INSERT OR REPLACE INTO almacen (clave, valor, vence) VALUES (?, ?, ?)",
+                              (clave, valor, time.time() + ttl if ttl else None))
+        self._escrituras += 1
+        # De vez en cuando se barren los vencidos (no hay otro proceso que lo haga)
+        if self._escrituras % 200 == 0:
+            with con: con.execute("DELETE FROM almacen WHERE vence < ?", (time.time(),))
+
+    def _borrar(self, clave):
+        con = self._con()
+        with con: con.execute("DELETE FROM almacen WHERE clave = ?", (clave,))
+
+    def estado(self):
+        return dict(super().estado(), ruta=self.ruta)
+
+class AlmacenRedis(Almacen):
+    """Redis (o cualquier servidor que hable su protocolo) para réplicas en distintas máquinas."""
+
+    tipo = "redis"
+
+    def __init__(self, url, **kw):
+        super().__init__(**kw)
+        import redis  # opcional: solo hace falta si se elige este backend
+        self.url = url
+        self.cliente = redis.Redis.from_url(url, socket_timeout=TIMEOUT_ALMACEN, socket_connect_timeout=TIMEOUT_ALMACEN)
+
+    def _obtener(self, clave):
+        valor = self.cliente.get(clave)
+        return None if valor is None else valor.decode("utf-8")
+
+    def _guardar(self, clave, valor, ttl):
+        self.cliente.set(clave, valor, ex=int(ttl) if ttl else None)
+
+    def _borrar(self, clave):
+        self.cliente.delete(clave)
+
+    def estado(self):
+        return dict(super().estado(), url=self.url.split("@")[-1])  # sin la contraseña
+
+def crear_almacen(url=ALMACEN_URL):
+    """memoria:// | sqlite:///ruta/al/archivo.db | redis://host:6379/0 (rediss:// con TLS)."""
+    if url.startswith(("redis://", "rediss://")):
+        try:
+            return AlmacenRedis(url)
+        except ImportError:
+            # Sin el paquete redis se cae al archivo local: la réplica sigue andando, pero sin compartir
+            respaldo = AlmacenSQLite(RUTA_ALMACEN)
+            respaldo.error = "falta el paquete redis (pip install redis)"
+            return respaldo
+    if url.startswith("memoria://"): return AlmacenMemoria()
+    return AlmacenSQLite(url[len("sqlite:///"):] if url.startswith("sqlite:///") else RUTA_ALMACEN)
+
+_almacen = None
+_almacen_lock = threading.Lock()
+
+def almacen():
+    global _almacen
+    with _almacen_lock:
+        if _almacen is None: _almacen = crear_almacen()
+    return _almacen
@@ -3,16 +3,18 @@ import streamlit as st
 import datetime
 import random
 import time
-from PIL import Image
-import google.generativeai as genai
-import os
+import uuid
 import re
 import pandas as pd 
 
 # IMPORTAR MÓDULOS PROPIOS
 from config import *
 from funciones import *
-from estilos import cargar_estilos, auto_scroll
+from estilos import cargar_estilos, auto_scroll, refrescar_header, recordar_sesion
+from arranque import esperar_listo, estado_arranque
+from metricas import metricas
+from eventos import registro_eventos
+from almacen import almacen
 
 # ==========================================
 # 1. CONFIGURACIÓN
@@ -23,18 +25,32 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# Inicializar datos externos
+T0_RENDER = time.perf_counter()
+
+# Inicializar datos externos (ya calentados en paralelo al iniciar el proceso)
+esperar_listo()
 DOLAR_BNA = obtener_dolar_bna() 
 csv_context = load_data()
 
 # ==========================================
 # 2. ESTADO
 # ==========================================
-if "cart" not in st.session_state: st.session_state.cart = []
+if "sesion_id" not in st.session_state:
+    # El id del carrito vive en una cookie de este navegador: al recargar o caer en otra réplica se recupera,
+    # pero un link reenviado no lleva el carrito de quien lo manda
+    sesion = str(st.context.cookies.get(COOKIE_SESION) or "")
+    st.session_state.sesion_id = sesion if re.fullmatch(r"[0-9a-f]{12}", sesion) else uuid.uuid4().hex[:12]
+    if "s" in st.query_params: del st.query_params["s"]  # links viejos con el id a la vista
+if "cart" not in st.session_state:
+    st.session_state.cart = recuperar_carrito(st.session_state.sesion_id)
+    st.session_state.cart_guardado = st.session_state.cart.revision
 if "log_data" not in st.session_state: st.session_state.log_data = []
+if "latencias" not in st.session_state: st.session_state.latencias = []
 if "admin_mode" not in st.session_state: st.session_state.admin_mode = False
 if "last_processed_file" not in st.session_state: st.session_state.last_processed_file = None
 if "discount_tier_reached" not in st.session_state: st.session_state.discount_tier_reached = 0
+if "cart_rev" not in st.session_state: st.session_state.cart_rev = 0
+if "pedidos_rechazados" not in st.session_state: st.session_state.pedidos_rechazados = []
 
 if "expiry_time" not in st.session_state:
     st.session_state.expiry_time = datetime.datetime.now() + datetime.timedelta(minutes=MINUTOS_OFERTA)
@@ -46,76 +62,41 @@ if "messages" not in st.session_state:
 👇 **PASAME TU PEDIDO YA** (Escribí o usá los botones rápidos).
 *¡El precio se congela por 3 minutos!* ⏳
     """
-    st.session_state.messages = [{"role": "assistant", "content": saludo}]
+    st.session_state.messages = []
+    agregar_mensaje("assistant", saludo)
+if "mensajes_visibles" not in st.session_state: st.session_state.mensajes_visibles = MENSAJES_VISIBLES
 
 # ==========================================
 # 3. CEREBRO IA (MODELO 2.5 ACTIVADO)
 # ==========================================
-api_key = None
-try:
-    if "GOOGLE_API_KEY" in st.secrets:
-        api_key = st.secrets["GOOGLE_API_KEY"]
-    elif "GOOGLE_API_KEY" in os.environ:
-        api_key = os.environ.get("GOOGLE_API_KEY")
-except: pass
-
-if api_key:
-    try: genai.configure(api_key=api_key)
-    except: pass
-
-if "chat_session" not in st.session_state:
-    if not api_key:
-        st.error("🚨 ERROR CRÍTICO: Falta la API KEY en Secrets.")
-    else:
-        sys_prompt = get_sys_prompt(csv_context, DOLAR_BNA)
-        
-        # ⚠️ ESTRATEGIA DE CONEXIÓN ACTUALIZADA:
-        # 1. Gemini 2.5 Flash Image (El que Google sugirió en el error).
-        # 2. Gemini 2.0 Flash Exp (Tu favorito).
-        # 3. Gemini 1.5 Flash (Respaldo final).
-        
-        intentos = [
-            "gemini-2.5-flash-image", # NUEVO: Sugerido por el error 429
-            "gemini-2.0-flash-exp",   
-            "gemini-1.5-flash",
-            "gemini-pro"
-        ]
-        
-        connected_model = None
-        error_log = []
-        
-        for modelo in intentos:
-            try:
-                st.session_state.chat_session = genai.GenerativeModel(
-                    modelo, system_instruction=sys_prompt
-                ).start_chat(history=[])
-                connected_model = modelo
-                break 
-            except Exception as e:
-                error_log.append(f"{modelo}: {e}")
-                continue 
-
-        if not connected_model:
-            st.error(f"⚠️ Error de conexión IA. Detalles: {error_log}")
+api_key = registro_modelos().api_key or obtener_api_key()  # los secrets se leen una vez por proceso
+
+if not api_key:
+    st.error("🚨 ERROR CRÍTICO: Falta la API KEY en Secrets.")
+else:
+    # Prueba de modelos y prompt: una sola vez por proceso (acá es solo una búsqueda en el registro)
+    registro = preparar_ia(api_key)
+    if "chat_session" not in st.session_state:
+        # ⚠️ ESTRATEGIA DE CONEXIÓN: el primer modelo disponible de MODELOS_IA (config.py)
+        if registro.disponibles:
+            st.session_state.chat_session = registro.nueva_sesion()
+            st.session_state.chat_session.estado_carrito = resumen_carrito
+        else:
+            st.error(f"⚠️ Error de conexión IA. Detalles: {registro.errores}")
 
 # ==========================================
 # 4. UI: HEADER Y ESTILOS
 # ==========================================
 subtotal, total_final, desc_actual, color_barra, nombre_nivel, prox_meta, seg_restantes, oferta_viva, color_timer, reloj_python, dinero_ahorrado = calcular_negocio()
-porcentaje_barra = 100
-if prox_meta > 0: porcentaje_barra = min((subtotal / prox_meta) * 100, 100)
-
-display_precio = f"${total_final:,.0f}" if subtotal > 0 else "COTIZAR"
-display_iva = "+IVA" if subtotal > 0 else ""
-display_badge = nombre_nivel[:25] + "..." if len(nombre_nivel) > 25 and subtotal > 0 else (nombre_nivel if subtotal > 0 else "⚡ 3% OFF")
-subtext_badge = f"🔥 AHORRAS: ${dinero_ahorrado:,.0f}" if dinero_ahorrado > 0 else "TIEMPO LIMITADO"
+porcentaje_barra, display_precio, display_iva, display_badge, subtext_badge = textos_header(subtotal, total_final, nombre_nivel, prox_meta, dinero_ahorrado)
 
 cargar_estilos(color_barra, porcentaje_barra, color_timer, reloj_python, display_badge, subtext_badge, display_precio, display_iva, seg_restantes, generar_link_wa, total_final, oferta_viva)
 
 # ==========================================
 # 5. INTERFAZ TABS
 # ==========================================
-tab1, tab2 = st.tabs(["💬 COTIZAR", f"🛒 MI PEDIDO ({len(st.session_state.cart)})"])
+# Etiquetas fijas (si cambian, Streamlit vuelve a la primera pestaña); el contador lo pone el header
+tab1, tab2, tab3 = st.tabs(["💬 COTIZAR", "🛒 MI PEDIDO", "🔎 CATÁLOGO"])
 spacer = '<div style="height: 20px;"></div>'
 
 with tab1:
@@ -129,13 +110,15 @@ with tab1:
     if 0 < prox_meta - subtotal < 200000 and oferta_viva:
         st.toast(f"🚨 ¡FALTAN ${prox_meta - subtotal:,.0f} PARA DESCUENTO! SUMÁ PINTURA O DISCOS.", icon="🔥")
 
-    for m in st.session_state.messages:
-        if m["role"] != "system":
-            # LIMPIEZA VISUAL
-            clean = re.sub(r'\[ADD:.*?\]', '', m["content"])
-            clean = clean.replace("[TEXTO VISIBLE]", "").replace("SALIDA:", "").strip()
-            
-            if clean: st.chat_message(m["role"], avatar="👷‍♂️" if m["role"]=="assistant" else "👤").markdown(clean)
+    # Solo los últimos N mensajes (ya limpios); los anteriores quedan detrás de un botón
+    ocultos = len(st.session_state.messages) - st.session_state.mensajes_visibles
+    if ocultos > 0 and st.button(f"⬆️ Ver mensajes anteriores ({ocultos})", use_container_width=True):
+        st.session_state.mensajes_visibles += MENSAJES_VISIBLES
+        st.rerun()
+    for m in st.session_state.messages[-st.session_state.mensajes_visibles:]:
+        if m["role"] == "system": continue
+        if "display" not in m: m["display"] = limpiar_visible(m["content"]).strip()
+        if m["display"]: st.chat_message(m["role"], avatar="👷‍♂️" if m["role"]=="assistant" else "👤").markdown(m["display"])
 
     with st.container():
         c1, c2 = st.columns([1.5, 8.5])
@@ -146,10 +129,12 @@ with tab1:
                 if img:
                     fid = f"{img.name}_{img.size}"
                     if st.session_state.last_processed_file != fid:
-                        with st.spinner("⚡ Procesando con visión contextual..."):
-                            txt = procesar_input(Image.open(img), True)
-                            news = parsear_ordenes_bot(txt)
-                            st.session_state.messages.append({"role": "assistant", "content": txt})
+                        with st.spinner("⚡ Procesando con visión contextual..."), aviso_cola() as aviso:
+                            txt = procesar_imagen(img.getvalue())
+                            aviso.empty()
+                            news, rechazo = parsear_ordenes_bot(txt)
+                            agregar_mensaje("assistant", txt)
+                            if rechazo: agregar_mensaje("assistant", rechazo)
                             st.session_state.last_processed_file = fid
                             if news: st.balloons()
                             st.rerun()
@@ -159,75 +144,154 @@ with tab1:
         st.caption("Atajos rápidos:")
         cb1, cb2, cb3 = st.columns(3)
         if cb1.button("🏗️ Hierros", use_container_width=True):
-            st.session_state.messages.append({"role": "user", "content": "Hola, necesito precio de hierros de 6mm, 8mm y 10mm."})
-            st.rerun()
+            st.session_state.pendiente = "Hola, necesito precio de hierros de 6mm, 8mm y 10mm."
         if cb2.button("🏠 Techos", use_container_width=True):
-            st.session_state.messages.append({"role": "user", "content": "Cotizame chapa cincalum y perfiles C para un techo de 40m2."})
-            st.rerun()
+            st.session_state.pendiente = "Cotizame chapa cincalum y perfiles C para un techo de 40m2."
         if cb3.button("💰 Ofertas", use_container_width=True):
-            st.session_state.messages.append({"role": "user", "content": "¿Qué tenés en oferta hoy para llegar al descuento mayorista?"})
-            st.rerun()
+            st.session_state.pendiente = "¿Qué tenés en oferta hoy para llegar al descuento mayorista?"
 
-    if p := st.chat_input("Escribí acá..."):
-        if p == "#admin": st.session_state.admin_mode = not st.session_state.admin_mode; st.rerun()
-        st.session_state.messages.append({"role": "user", "content": p})
+    p = st.chat_input("Escribí acá...") or st.session_state.pop("pendiente", None)
+    if p:
+        if p.startswith("#admin"):
+            # "#admin <clave>" (ADMIN_TOKEN en secrets o entorno); "#admin" solo la cierra. No se registra.
+            st.session_state.admin_mode = not st.session_state.admin_mode and es_admin(p[len("#admin"):].strip())
+            st.rerun()
+        agregar_mensaje("user", p)
+        registrar_evento("consulta", texto=p[:500])
         st.chat_message("user").markdown(p)
-        with st.chat_message("assistant", avatar="👷‍♂️"):
-            with st.spinner("Calculando logística y stock..."):
-                try:
-                    res = procesar_input(p)
-                    # VERIFICAR SI HAY ERROR EXPLÍCITO
-                    if res.startswith("⚠️ ERROR TÉCNICO") or res.startswith("⚠️ SERVIDORES"):
-                        st.error(res)
-                    else:
-                        news = parsear_ordenes_bot(res)
-                        
+        with st.chat_message("assistant", avatar="👷‍♂️"), aviso_cola() as aviso:
+            try:
+                t0 = time.perf_counter()
+                mostrado = True
+                res = respuesta_local(p)
+                if res:
+                    # Flete o pedido simple resuelto en el momento, sin ida y vuelta a la IA
+                    st.markdown(limpiar_visible(res).strip())
+                    registrar_latencia(None, time.perf_counter() - t0, "local")
+                elif STREAMING:
+                    # El texto se va mostrando a medida que llega (tags [ADD:...] filtrados al vuelo)
+                    stream = procesar_input_stream(p)
+                    st.write_stream(stream)
+                    res = stream.texto
+                    registrar_latencia(stream.ttft, stream.total)
+                else:
+                    mostrado = False
+                    with st.spinner("Calculando logística y stock..."):
+                        res = procesar_input(p)
+                    registrar_latencia(None, time.perf_counter() - t0, "normal")
+                aviso.empty()
+                # VERIFICAR SI HAY ERROR EXPLÍCITO
+                if es_error(res):
+                    st.error(res)
+                else:
+                    news, rechazo = parsear_ordenes_bot(res)
+                    
+                    if not mostrado:
                         # LIMPIEZA VISUAL EN TIEMPO REAL
-                        display = re.sub(r'\[ADD:.*?\]', '', res)
-                        display = display.replace("[TEXTO VISIBLE]", "").replace("SALIDA:", "").strip()
-                        
-                        st.markdown(display)
-                        
-                        if news: 
-                            st.toast(random.choice(TOASTS_EXITO), icon='🔥')
-                            if desc_actual >= 12: st.balloons()
-                        
-                        st.session_state.messages.append({"role": "assistant", "content": res})
-                        if news: time.sleep(1); st.rerun()
-                except Exception as e: st.error(f"Error crítico en UI: {e}")
+                        st.markdown(limpiar_visible(res).strip())
+                    # Lo que el catálogo no reconoció se le dice al cliente (no desaparece en silencio)
+                    if rechazo: st.warning(rechazo)
+                    
+                    if news: 
+                        st.toast(random.choice(TOASTS_EXITO), icon='🔥')
+                        if desc_actual >= 12: st.balloons()
+                    
+                    agregar_mensaje("assistant", res)
+                    if rechazo: agregar_mensaje("assistant", rechazo)
+                    log_interaction(p, sum(i['subtotal'] for i in news))
+                    if news: time.sleep(1); st.rerun()
+            except Exception as e: st.error(f"Error crítico en UI: {e}")
 
-with tab2:
+@st.fragment
+def editor_carrito():
+    # Fragmento: editar el carrito solo redibuja esta pestaña y el header (no toda la app)
     st.markdown(spacer, unsafe_allow_html=True)
+    subtotal, total_final, _, color_barra, nombre_nivel, prox_meta, _, oferta_viva, _, _, dinero_ahorrado = calcular_negocio()
     if not st.session_state.cart:
         st.info("Carrito vacío. Agregá items para ver el precio final.")
     else:
-        indices_to_remove = []
-        for i, item in enumerate(st.session_state.cart):
-            with st.container():
-                c1, c2, c3 = st.columns([3, 1.5, 0.5])
-                c1.markdown(f"**{item['producto']}**\n<span style='color:grey;font-size:0.8em'>${item['precio_unit']:,.0f} unit</span>", unsafe_allow_html=True)
-                
-                nueva_cant = c2.number_input("Cant", 0.0, value=float(item['cantidad']), key=f"q_{i}", label_visibility="collapsed")
-                
-                if nueva_cant != item['cantidad']:
-                    if nueva_cant == 0:
-                        indices_to_remove.append(i)
-                    else:
-                        st.session_state.cart[i]['cantidad'] = nueva_cant
-                        st.session_state.cart[i]['subtotal'] = nueva_cant * item['precio_unit']
-                        st.rerun()
-
-                if c3.button("🗑️", key=f"d_{i}"): 
-                    indices_to_remove.append(i)
-                st.markdown("---")
-        
-        if indices_to_remove:
-            for index in sorted(indices_to_remove, reverse=True):
-                del st.session_state.cart[index]
-            st.rerun()
+        filas = pd.DataFrame([{"Producto": i['producto'], "Cant": float(i['cantidad']), "Unit": i['precio_unit'], "Subtotal": i['subtotal']} for i in st.session_state.cart])
+        # Todas las cantidades se editan juntas y se aplican en un solo paso (callback, sin st.rerun)
+        editor_key = f"editor_{st.session_state.cart_rev}"
+        with st.form("form_carrito", border=False):
+            st.data_editor(
+                filas, key=editor_key, hide_index=True, use_container_width=True, num_rows="delete",
+                disabled=["Producto", "Unit", "Subtotal"],
+                column_config={
+                    "Cant": st.column_config.NumberColumn(min_value=0.0, step=1.0),
+                    "Unit": st.column_config.NumberColumn(format="$%.0f"),
+                    "Subtotal": st.column_config.NumberColumn(format="$%.0f"),
+                },
+            )
+            st.form_submit_button("✅ ACTUALIZAR PEDIDO", use_container_width=True, on_click=aplicar_editor_carrito, args=(editor_key,))
         
         st.markdown(f"""<a href="{generar_link_wa(total_final)}" target="_blank" style="display:block; width:100%; background: #333; color:white; margin-top:20px; text-align:center; padding:15px; border-radius:12px; text-decoration:none; font-weight:bold; opacity:0.8;">Link Alternativo de Pago</a>""", unsafe_allow_html=True)
-        if st.button("Vaciar Carrito", use_container_width=True): st.session_state.cart = []; st.rerun()
+        st.button("Vaciar Carrito", use_container_width=True, on_click=vaciar_carrito)
+
+    # Header, botón de pago y contador de la pestaña se actualizan en el navegador
+    porcentaje_barra, display_precio, display_iva, _, subtext_badge = textos_header(subtotal, total_final, nombre_nivel, prox_meta, dinero_ahorrado)
+    refrescar_header(display_precio, display_iva, subtext_badge, color_barra, porcentaje_barra, total_final, generar_link_wa(total_final), len(st.session_state.cart), oferta_viva)
+
+with tab2:
+    editor_carrito()
+
+@st.fragment
+def buscador_catalogo():
+    # Fragmento: escribir y filtrar solo redibuja esta pestaña; agregar al carrito recarga todo
+    st.markdown(spacer, unsafe_allow_html=True)
+    texto = st.text_input("Buscar producto", placeholder="Ej: hierro 8, chapa cincalum, perfil c...", label_visibility="collapsed")
+    indice = indice_catalogo()
+    if indice is None:
+        st.warning("Catálogo no disponible por el momento.")
+        return
+    tipo = st.pills("Tipo", indice.tipos[:10], label_visibility="collapsed") if indice.tipos else None
+    if not texto and not tipo:
+        st.caption("Escribí el producto o elegí un tipo.")
+        return
+    indice, resultados = buscar_en_catalogo(texto, tipo)
+    oferta_viva = calcular_negocio()[7]  # con los precios vencidos no se agrega
+    if resultados is None or resultados.empty:
+        st.info("Sin resultados. Probá con otra palabra o preguntale a Miguel en COTIZAR.")
+        return
+    for i, fila in resultados.iterrows():
+        c1, c2, c3 = st.columns([6, 2, 1.2], vertical_alignment="center")
+        precio = fila["PRECIO_ARS"]
+        c1.markdown(f"**{fila[indice.col_nombre]}**  \n{'$' + format(precio, ',.0f') + ' +IVA' if precio == precio else 'Consultar precio'}")
+        cant = c2.number_input("Cant", min_value=0.0, value=1.0, step=1.0, key=f"cant_cat_{i}", label_visibility="collapsed")
+        if c3.button("➕", key=f"add_cat_{i}", disabled=precio != precio or not oferta_viva):
+            if agregar_del_catalogo(indice, fila, cant): st.rerun()
+
+with tab3:
+    buscador_catalogo()
 
 auto_scroll()
-if st.session_state.admin_mode: st.dataframe(pd.DataFrame(st.session_state.log_data))
+recordar_sesion(st.session_state.sesion_id)
+if st.session_state.admin_mode:
+    st.json(estado_arranque())
+    st.dataframe(pd.DataFrame(st.session_state.log_data))
+    st.dataframe(pd.DataFrame(st.session_state.latencias))
+    st.dataframe(pd.DataFrame(st.session_state.pedidos_rechazados))
+
+    # Métricas de todo el proceso (todas las sesiones desde que arrancó)
+    m = metricas()
+    st.subheader("📊 Métricas del proceso")
+    tasa = lambda x: f"{x:.0%}" if x is not None else "-"
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Respuestas sin IA", tasa(m.tasa("respuesta_local")))
+    c2.metric("Cache de fotos", tasa(m.tasa("cache_imagenes")))
+    c3.metric("En cola IA", registro_modelos().planificador.en_cola())
+    st.dataframe(pd.DataFrame(m.filas_histogramas()), use_container_width=True)
+    st.dataframe(pd.DataFrame(m.filas_contadores()), use_container_width=True)
+    d1, d2 = st.columns(2)
+    d1.download_button("⬇️ Prometheus", m.prometheus(), "metricas.prom", mime="text/plain", use_container_width=True)
+    d2.download_button("⬇️ JSON", m.a_json(), "metricas.json", mime="application/json", use_container_width=True)
+
+    st.subheader("🗂️ Eventos")
+    st.json(registro_eventos().estado())
+    st.dataframe(pd.DataFrame(registro_eventos().recientes()), use_container_width=True)
+
+    st.subheader("🗄️ Almacén compartido")
+    st.json(almacen().estado())
+
+guardar_carrito()
+metricas().observar("etapa_segundos", time.perf_counter() - T0_RENDER, etapa="render")
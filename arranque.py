@@ -0,0 +1,62 @@
+# arranque.py
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import *
+from funciones import obtener_dolar_bna, load_data, indice_catalogo, precios_catalogo, obtener_api_key, preparar_ia
+from catalogo import servicio_catalogo
+
+# ==========================================
+# CALENTAMIENTO AL INICIAR EL PROCESO
+# ==========================================
+_listo = threading.Event()
+_lock = threading.Lock()
+_hilo = None
+_estado = {"listo": False, "segundos": None, "dolar": None, "catalogo": None, "filas": 0, "error": None}
+
+def _calentar():
+    t0 = time.perf_counter()
+    try:
+        # Dólar y planilla en paralelo: el arranque tarda lo que el más lento, no la suma
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="arranque") as pool:
+            f_dolar = pool.submit(obtener_dolar_bna)
+            f_datos = pool.submit(load_data)
+            dolar = f_dolar.result()
+            f_datos.result()  # deja la planilla bajada para el índice
+        indice = indice_catalogo()
+        precios_catalogo(indice)  # precios en pesos para el dólar del día
+        # Prueba de modelos y prompt del sistema: quedan listos para todas las sesiones
+        api_key = obtener_api_key()
+        if api_key: preparar_ia(api_key)
+        _estado.update(dolar=dolar, filas=len(indice.df) if indice is not None else 0)
+    except Exception as e:
+        _estado["error"] = str(e)
+    finally:
+        _estado.update(listo=True, segundos=round(time.perf_counter() - t0, 3), catalogo=servicio_catalogo().version)
+        _listo.set()
+
+def calentar():
+    """Arranca el calentamiento una sola vez por proceso (no bloquea)."""
+    global _hilo
+    with _lock:
+        if _hilo is None:
+            _hilo = threading.Thread(target=_calentar, name="arranque", daemon=True)
+            _hilo.start()
+
+def esperar_listo(timeout=ESPERA_ARRANQUE):
+    calentar()
+    return _listo.wait(timeout)
+
+def estado_arranque():
+    return dict(_estado)
+
+if __name__ == "__main__":
+    # python arranque.py [flags de streamlit]: calienta en paralelo mientras levanta el servidor.
+    # Se importa a sí mismo como "arranque" para que app.py comparta este mismo estado.
+    import arranque
+    arranque.calentar()
+    from streamlit.web import cli
+    sys.argv = ["streamlit", "run", "app.py", *sys.argv[1:]]
+    sys.exit(cli.main())
@@ -0,0 +1,131 @@
+# bench/correr.py
+"""Benchmark completo: un escenario por tamaño de catálogo, reporte y comparación contra una base.
+
+    python -m bench.correr                                   # 100, 1k, 10k y 100k SKUs
+    python -m bench.correr --tamanos 100 1000 --sesiones 4   # el resto de los flags va a bench.escenario
+    python -m bench.correr --guardar-base                    # deja este resultado como referencia
+    python -m bench.correr --base .cache/bench/base.json     # sale con 1 si algo empeoró (para antes de un deploy)
+
+Flags de carga y del modelo falso: python -m bench.escenario -h
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CARPETA = os.path.join(RAIZ, ".cache", "bench")
+
+def prompt_max(r):
+    return max((h["max"] for h in r["prompt_tokens"].values()), default=None)
+
+# Qué se compara contra la base: (nombre, cómo sacarlo del resultado, holgura absoluta)
+# La holgura evita marcar como regresión el ruido en valores chicos.
+COMPARADAS = [
+    ("turno p95 (s)",        lambda r: r["turno_s"].get("p95"), 0.10),
+    ("turno p99 (s)",        lambda r: r["turno_s"].get("p99"), 0.20),
+    ("rerun p95 (s)",        lambda r: r["rerun_s"].get("p95"), 0.03),
+    ("carga p95 (s)",        lambda r: r["carga_s"].get("p95"), 0.10),
+    ("arranque (s)",         lambda r: r["arranque_s"], 0.20),
+    ("prompt máx (tokens)",  prompt_max, 50),
+    ("prompt sistema (tok)", lambda r: r["prompt_sistema_tokens"], 50),
+    ("memoria/sesión (MB)",  lambda r: r["memoria_sesion_mb"], 2.0),
+]
+
+def escenario(skus, extra):
+    """Corre bench.escenario en un proceso aparte y devuelve su JSON."""
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-m", "bench.escenario", "--skus", str(skus), *extra],
+                          cwd=RAIZ, capture_output=True, text=True)
+    lineas = proc.stdout.strip().splitlines()
+    if proc.returncode != 0 or not lineas:
+        return {"skus": skus, "fallo": (proc.stderr.strip().splitlines() or ["sin salida"])[-1]}
+    resultado = json.loads(lineas[-1])
+    resultado["proceso_s"] = round(time.perf_counter() - t0, 1)
+    return resultado
+
+def _celda(valor):
+    return "-" if valor is None else (f"{valor:,.3f}" if isinstance(valor, float) else str(valor))
+
+def tabla(resultados):
+    """Resumen en markdown (una fila por tamaño de catálogo)."""
+    columnas = ["SKUs", "arranque s", "prompt tok máx", "turno p50", "turno p95", "turno p99",
+                "rerun p50", "rerun p95", "ttft p95", "MB/sesión", "429", "errores"]
+    filas = ["| " + " | ".join(columnas) + " |", "|" + "---|" * len(columnas)]
+    for r in resultados:
+        if "fallo" in r:
+            filas.append(f"| {r['skus']} | FALLÓ: {r['fallo']} |" + " |" * (len(columnas) - 2))
+            continue
+        ttft = max((h["p95"] for h in r["ttft_s"].values()), default=None)
+        valores = [r["skus"], r["arranque_s"], prompt_max(r), r["turno_s"].get("p50"), r["turno_s"].get("p95"),
+                   r["turno_s"].get("p99"), r["rerun_s"].get("p50"), r["rerun_s"].get("p95"), ttft,
+                   r["memoria_sesion_mb"], r["cuotas_429"], r["n_errores"]]
+        filas.append("| " + " | ".join(_celda(v) for v in valores) + " |")
+    return "\n".join(filas)
+
+def comparar(resultados, base, tolerancia):
+    """Regresiones contra la base: más de `tolerancia` (proporción) + la holgura de cada métrica."""
+    previos = {r["skus"]: r for r in base.get("resultados", []) if "fallo" not in r}
+    regresiones = []
+    for r in resultados:
+        if "fallo" in r:
+            regresiones.append(f"{r['skus']} SKUs: el escenario falló ({r['fallo']})")
+            continue
+        if r["n_errores"]: regresiones.append(f"{r['skus']} SKUs: {r['n_errores']} excepciones en la app")
+        previo = previos.get(r["skus"])
+        if previo is None: continue
+        for nombre, valor, holgura in COMPARADAS:
+            antes, ahora = valor(previo), valor(r)
+            if antes is None or ahora is None: continue
+            if ahora > antes * (1 + tolerancia) + holgura:
+                regresiones.append(f"{r['skus']} SKUs: {nombre} {_celda(antes)} -> {_celda(ahora)}")
+    return regresiones
+
+def version_git():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark de la app con Gemini falso y catálogos sintéticos",
+                                epilog="Los demás flags se pasan a bench.escenario (ver python -m bench.escenario -h).")
+    p.add_argument("--tamanos", type=int, nargs="+", default=[100, 1000, 10000, 100000], help="SKUs por escenario")
+    p.add_argument("--salida", default=os.path.join(CARPETA, "ultimo.json"), help="JSON con el resultado completo")
+    p.add_argument("--base", default=os.path.join(CARPETA, "base.json"), help="resultado de referencia")
+    p.add_argument("--tolerancia", type=float, default=0.2, help="empeoramiento tolerado (0.2 = 20%%)")
+    p.add_argument("--guardar-base", action="store_true", help="guarda este resultado como la nueva base")
+    args, extra = p.parse_known_args()
+
+    resultados = []
+    for skus in args.tamanos:
+        print(f"▶ {skus} SKUs...", flush=True)
+        resultados.append(escenario(skus, extra))
+    informe = {"fecha": time.strftime("%Y-%m-%d %H:%M:%S"), "git": version_git(), "flags": extra, "resultados": resultados}
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.salida)), exist_ok=True)
+    with open(args.salida, "w", encoding="utf-8") as f: json.dump(informe, f, ensure_ascii=False, indent=1)
+    resumen = tabla(resultados)
+    with open(os.path.splitext(args.salida)[0] + ".md", "w", encoding="utf-8") as f: f.write(resumen + "\n")
+    print(resumen)
+
+    if args.guardar_base:
+        with open(args.base, "w", encoding="utf-8") as f: json.dump(informe, f, ensure_ascii=False, indent=1)
+        print(f"Base guardada en {args.base}")
+        regresiones = comparar(resultados, {}, args.tolerancia)  # solo fallos y excepciones
+    elif os.path.exists(args.base):
+        with open(args.base, encoding="utf-8") as f: base = json.load(f)
+        if base.get("flags") != extra: print(f"⚠️ La base se corrió con otros flags: {base.get('flags')}")
+        regresiones = comparar(resultados, base, args.tolerancia)
+        print(f"Comparado contra {args.base} ({base.get('git')}, {base.get('fecha')})")
+    else:
+        regresiones = comparar(resultados, {}, args.tolerancia)
+
+    for r in regresiones: print(f"❌ {r}")
+    if not regresiones: print("✅ Sin regresiones")
+    return 1 if regresiones else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+# bench/escenario.py
+"""Un escenario de carga: un catálogo sintético, N sesiones de AppTest en paralelo, Gemini falso.
+
+    python -m bench.escenario --skus 10000 --sesiones 8 --turnos 5
+
+Corre en su propio proceso (lo lanza bench.correr) para que caches, memoria y
+métricas de un tamaño de catálogo no se mezclen con las del siguiente.
+La última línea de la salida es el resultado en JSON.
+
+Con el cupo de config.py (RPM_IA / RAFAGA_IA) la espera del token bucket domina
+la cola de latencia cuando hay muchas sesiones: --rpm 100000 mide solo la app.
+"""
+import os
+import gc
+import sys
+import json
+import time
+import argparse
+import tempfile
+import traceback
+import threading
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Nada de red ni de disco compartido: almacén en memoria (se fija antes de importar config)
+# y el log de eventos en un archivo temporal (en preparar)
+os.environ["PB_ALMACEN"] = "memoria://"
+os.environ.setdefault("GOOGLE_API_KEY", "clave-falsa")
+sys.path.insert(0, RAIZ)
+
+import numpy as np
+from streamlit import config as st_config
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1.util import build_mock_config_get_option
+
+import ia
+import catalogo
+import eventos
+from almacen import almacen
+from metricas import metricas
+from conversacion import estimar_tokens
+from bench.falso import PerfilModelo, ModeloFalso, PlanillaLocal, fabrica, catalogo_sintetico, productos_de
+
+# ==========================================
+# GUIONES DE SESIÓN
+# ==========================================
+GUIONES = [
+    ["hola, precio del hierro adn 8mm", "quiero 20 chapas acanaladas c25 de 4m y 10 perfiles c 100x50",
+     "cuanto sale el flete a rafaela", "sumame 5 caños estructurales 40x40", "listo, cuanto es el total?"],
+    ["necesito malla sima 15x15 6mm x 12", "tenes clavos punta paris 2 1/2?", "y alambre recocido n17",
+     "agregame 3 pinturas antioxido 4l", "pasame el total con iva"],
+    ["cotizame 50 hierros del 10 y 30 del 12", "cuanto me cobras el envio a san francisco",
+     "sumale 8 tubos redondos de 1", "electrodos 2.5mm tenes?", "dale cerramos"],
+]
+
+def guion(i, turnos):
+    base = GUIONES[i % len(GUIONES)]
+    return [base[t % len(base)] for t in range(turnos)]
+
+# ==========================================
+# MEDICIONES
+# ==========================================
+def rss_mb():
+    # Memoria residente actual del proceso (Linux); en otros sistemas, el pico
+    try:
+        with open("/proc/self/status") as f:
+            for linea in f:
+                if linea.startswith("VmRSS:"): return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def percentiles(valores):
+    if not valores: return {"n": 0}
+    v = np.asarray(valores)
+    return {"n": len(v), "prom": round(float(v.mean()), 4), "p50": round(float(np.percentile(v, 50)), 4),
+            "p95": round(float(np.percentile(v, 95)), 4), "p99": round(float(np.percentile(v, 99)), 4),
+            "max": round(float(v.max()), 4)}
+
+def histogramas(nombre):
+    # Resumen de un histograma de la app, por etiqueta (o uno solo si no tiene)
+    filas = [f for f in metricas().filas_histogramas() if f["métrica"] == nombre]
+    salida = {}
+    for f in filas:
+        etiqueta = ",".join(f"{k}={v}" for k, v in f.items() if k not in ("métrica", "n", "prom", "p50", "p95", "p99", "max")) or "total"
+        salida[etiqueta] = {k: f[k] for k in ("n", "prom", "p50", "p95", "p99", "max")}
+    return salida
+
+def contador(nombre, **labels):
+    return sum(f["valor"] for f in metricas().filas_contadores()
+               if f["métrica"] == nombre and all(str(f.get(k)) == str(v) for k, v in labels.items()))
+
+# ==========================================
+# SESIONES
+# ==========================================
+class Sesion(threading.Thread):
+    """Un cliente: abre la app, manda su guion turno por turno y después hace reruns sin input."""
+
+    def __init__(self, i, turnos, reruns, barrera, timeout):
+        super().__init__(name=f"sesion-{i}", daemon=True)
+        self.i, self.turnos, self.reruns, self.barrera, self.timeout = i, turnos, reruns, barrera, timeout
+        self.app = None
+        self.carga, self.turno, self.rerun, self.errores = [], [], [], []
+
+    def _correr(self, paso, destino):
+        t0 = time.perf_counter()
+        paso()
+        destino.append(time.perf_counter() - t0)
+        self.errores += [str(e.value)[:200] for e in self.app.exception]
+
+    def run(self):
+        try:
+            self.app = AppTest.from_file(os.path.join(RAIZ, "app.py"), default_timeout=self.timeout)
+            self.barrera.wait()
+            self._correr(self.app.run, self.carga)
+            for texto in guion(self.i, self.turnos):
+                self._correr(lambda: self.app.chat_input[0].set_value(texto).run(), self.turno)
+            for _ in range(self.reruns):
+                self._correr(self.app.run, self.rerun)
+        except Exception as e:
+            traceback.print_exc()
+            self.errores.append(f"{type(e).__name__}: {e}"[:200])
+
+def preparar(args):
+    """Planilla local con el catálogo sintético, dólar fijo y el modelo falso en el registro."""
+    # AppTest parchea config.get_option en cada run y lo restaura al terminar: con sesiones en paralelo
+    # una restauración le apaga "global.appTest" a otra que sigue corriendo. Queda fijo para todo el proceso.
+    st_config.get_option = build_mock_config_get_option({"global.appTest": True})
+    # Los eventos de las sesiones falsas no van al .cache/eventos.db de la app
+    eventos._registro = eventos.RegistroEventos(os.path.join(tempfile.mkdtemp(prefix="bench-"), "eventos.db"))
+    csv_texto = catalogo_sintetico(args.skus, args.semilla)
+    planilla = PlanillaLocal(csv_texto)
+    catalogo._servicio = catalogo.ServicioCatalogo(planilla.url)
+    almacen().guardar("dolar", args.dolar)
+    perfil = PerfilModelo(latencia=args.latencia, variacion=args.variacion, ttft=args.ttft, chunk=args.chunk,
+                          pausa_chunk=args.pausa_chunk, prob_429=args.prob_429, json=not args.sin_json,
+                          productos=productos_de(csv_texto), semilla=args.semilla)
+    registro = ia.registro_modelos()
+    registro.fabrica = fabrica(perfil)
+    registro.api_key = os.environ["GOOGLE_API_KEY"]
+    registro.disponibles = list(registro.modelos)  # sin genai.get_model (no hay red)
+    if args.rpm: registro.planificador.bucket = ia.TokenBucket(args.rpm, max(args.rpm // 6, 1))
+    return planilla, perfil
+
+def correr(args):
+    planilla, perfil = preparar(args)
+    # Una sesión de calentamiento: índice, precios y prompt del sistema quedan armados (como en producción)
+    t0 = time.perf_counter()
+    calentamiento = AppTest.from_file(os.path.join(RAIZ, "app.py"), default_timeout=args.timeout)
+    calentamiento.run()
+    arranque = time.perf_counter() - t0
+    registro = ia.registro_modelos()
+    sistema = estimar_tokens(registro.prompt()) if registro.clave else None
+    del calentamiento
+    gc.collect()
+
+    rss_antes = rss_mb()
+    barrera = threading.Barrier(args.sesiones)
+    sesiones = [Sesion(i, args.turnos, args.reruns, barrera, args.timeout) for i in range(args.sesiones)]
+    t0 = time.perf_counter()
+    for s in sesiones: s.start()
+    for s in sesiones: s.join()
+    total = time.perf_counter() - t0
+    gc.collect()
+    # Las sesiones siguen vivas (cada AppTest guarda su session_state): la diferencia es lo que pesan
+    rss_despues = rss_mb()
+    planilla.cerrar()
+
+    errores = [e for s in sesiones for e in s.errores]
+    return {
+        "skus": args.skus, "sesiones": args.sesiones, "turnos": args.turnos,
+        "perfil": {k: v for k, v in vars(perfil).items() if not k.startswith("_") and k != "productos"},
+        "arranque_s": round(arranque, 3),
+        "duracion_s": round(total, 3),
+        "prompt_sistema_tokens": sistema,
+        "prompt_tokens": histogramas("prompt_tokens"),
+        "respuesta_tokens": histogramas("respuesta_tokens"),
+        "carga_s": percentiles([v for s in sesiones for v in s.carga]),
+        "turno_s": percentiles([v for s in sesiones for v in s.turno]),
+        "rerun_s": percentiles([v for s in sesiones for v in s.rerun]),
+        "ttft_s": histogramas("ttft_segundos"),
+        "cola_s": histogramas("cola_segundos"),
+        "etapas_s": histogramas("etapa_segundos"),
+        "memoria_sesion_mb": round((rss_despues - rss_antes) / args.sesiones, 2),
+        "rss_mb": round(rss_despues, 1),
+        "llamadas_ia": ModeloFalso.llamadas,
+        "cuotas_429": ModeloFalso.cuotas,
+        "respaldos": contador("respaldo"),
+        "respuestas_locales": contador("respuesta_local", resultado="hit"),
+        "errores": errores[:20],
+        "n_errores": len(errores),
+    }
+
+def opciones(parser=None):
+    """Flags del escenario (bench.correr los reenvía tal cual)."""
+    p = parser or argparse.ArgumentParser(description="Un escenario de carga con Gemini falso")
+    p.add_argument("--skus", type=int, default=1000, help="filas del catálogo sintético")
+    p.add_argument("--sesiones", type=int, default=8, help="sesiones concurrentes")
+    p.add_argument("--turnos", type=int, default=5, help="mensajes por sesión")
+    p.add_argument("--reruns", type=int, default=3, help="reruns sin input al final de cada sesión")
+    p.add_argument("--latencia", type=float, default=0.8, help="segundos por respuesta (sin streaming)")
+    p.add_argument("--ttft", type=float, default=0.3, help="segundos hasta el primer pedazo (streaming)")
+    p.add_argument("--variacion", type=float, default=0.3, help="+/- proporción aleatoria de las esperas")
+    p.add_argument("--chunk", type=int, default=24, help="caracteres por pedazo del stream")
+    p.add_argument("--pausa-chunk", type=float, default=0.02, help="segundos entre pedazos")
+    p.add_argument("--prob-429", type=float, default=0.0, help="probabilidad de 429 por llamada")
+    p.add_argument("--sin-json", action="store_true", help="el modelo rechaza response_schema (respuesta con tags)")
+    p.add_argument("--rpm", type=int, default=0, help="cupo por minuto del planificador (0: el de config.py)")
+    p.add_argument("--dolar", type=float, default=1000.0)
+    p.add_argument("--semilla", type=int, default=0)
+    p.add_argument("--timeout", type=float, default=90, help="segundos máximos por rerun de AppTest")
+    return p
+
+if __name__ == "__main__":
+    resultado = correr(opciones().parse_args())
+    print(json.dumps(resultado, ensure_ascii=False), flush=True)
@@ -0,0 +1,168 @@
+# bench/falso.py
+import json
+import time
+import random
+import hashlib
+import itertools
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from google.api_core.exceptions import InvalidArgument, ResourceExhausted
+
+# ==========================================
+# GEMINI FALSO (MISMA INTERFAZ QUE genai.GenerativeModel)
+# ==========================================
+class PerfilModelo:
+    """Cómo se comporta el modelo falso: latencia, streaming, 429 y si acepta salida JSON."""
+
+    def __init__(self, latencia=0.8, variacion=0.3, ttft=0.3, chunk=24, pausa_chunk=0.02,
+                 prob_429=0.0, json=True, productos=(), semilla=None):
+        self.latencia = latencia        # segundos hasta la respuesta completa (sin streaming)
+        self.variacion = variacion      # +/- proporción aleatoria sobre las esperas
+        self.ttft = ttft                # segundos hasta el primer pedazo (streaming)
+        self.chunk = chunk              # caracteres por pedazo
+        self.pausa_chunk = pausa_chunk  # segundos entre pedazos
+        self.prob_429 = prob_429        # probabilidad de "429 cuota agotada" por llamada
+        self.json = json                # False: responde como un modelo sin response_schema (tags)
+        self.productos = list(productos)
+        self._azar = random.Random(semilla)
+        self._lock = threading.Lock()
+
+    def azar(self, metodo, *args):
+        with self._lock: return getattr(self._azar, metodo)(*args)
+
+    def espera(self, base):
+        return max(0.0, base * (1 + self.azar("uniform", -self.variacion, self.variacion)))
+
+class ModeloFalso:
+    """Reemplaza a genai.GenerativeModel en RegistroModelos.fabrica: no sale a la red."""
+
+    llamadas = 0
+    cuotas = 0
+    _lock = threading.Lock()
+
+    def __init__(self, nombre, system_instruction=None, perfil=None):
+        self.nombre = nombre
+        self.model_name = f"models/{nombre}"
+        self.system_instruction = system_instruction or ""
+        self.perfil = perfil or PerfilModelo()
+
+    @classmethod
+    def _contar(cls, cuota=False):
+        with cls._lock:
+            cls.llamadas += 1
+            cls.cuotas += cuota
+
+    def _pedido(self):
+        # Uno a tres productos reales del catálogo sintético (así pasan la validación)
+        p = self.perfil
+        if not p.productos: return []
+        return [{"cantidad": p.azar("randint", 1, 40), "producto": nombre, "precio_unit": 1000.0, "tipo": tipo}
+                for nombre, tipo in p.azar("sample", p.productos, min(len(p.productos), p.azar("randint", 1, 3)))]
+
+    def _texto(self, contenidos, con_json):
+        n = len(contenidos) if isinstance(contenidos, list) else 1
+        mensaje = f"Dale, te lo cotizo ({n} mensajes en contexto). Precio congelado por 3 minutos 🔥"
+        pedido = self._pedido()
+        if con_json: return json.dumps({"mensaje": mensaje, "pedido": pedido}, ensure_ascii=False)
+        tags = "".join(f"[ADD:{i['cantidad']}:{i['producto']}:{i['precio_unit']}:{i['tipo']}]" for i in pedido)
+        return f"{mensaje}\n{tags}"
+
+    def generate_content(self, contenidos, stream=False, generation_config=None, **kw):
+        p = self.perfil
+        if p.azar("random") < p.prob_429:
+            self._contar(cuota=True)
+            time.sleep(p.espera(p.ttft))
+            raise ResourceExhausted("429 Resource has been exhausted (e.g. check quota). [modelo falso]")
+        self._contar()
+        if generation_config is not None and not p.json:
+            raise InvalidArgument("response_mime_type no soportado [modelo falso]")
+        texto = self._texto(contenidos, generation_config is not None)
+        if not stream:
+            time.sleep(p.espera(p.latencia))
+            return SimpleNamespace(text=texto, usage_metadata=None)
+        # Como el SDK: generate_content vuelve recién con el primer pedazo (el TTFT lo paga el que llama,
+        # dentro del planificador), el resto llega al iterar
+        time.sleep(p.espera(p.ttft))
+        return itertools.chain([SimpleNamespace(text=texto[:p.chunk])], self._resto(texto))
+
+    def _resto(self, texto):
+        p = self.perfil
+        for i in range(p.chunk, len(texto), p.chunk):
+            time.sleep(p.espera(p.pausa_chunk))
+            yield SimpleNamespace(text=texto[i:i + p.chunk])
+
+def fabrica(perfil):
+    # Para RegistroModelos.fabrica: misma firma que genai.GenerativeModel(nombre, system_instruction=...)
+    return lambda nombre, system_instruction=None: ModeloFalso(nombre, system_instruction, perfil)
+
+# ==========================================
+# CATÁLOGO SINTÉTICO (100 A 100K PRODUCTOS)
+# ==========================================
+FAMILIAS = [
+    ("HIERRO ADN", "HIERRO", ["6MM", "8MM", "10MM", "12MM", "16MM", "20MM", "25MM"]),
+    ("CHAPA ACANALADA C25", "CHAPA", ["2M", "3M", "4M", "5M", "6M", "8M"]),
+    ("CHAPA TRAPEZOIDAL T101", "CHAPA", ["2M", "3M", "4M", "6M", "9M"]),
+    ("PERFIL C", "PERFIL", ["80X40", "100X50", "120X50", "140X60", "160X60"]),
+    ("CAÑO ESTRUCTURAL", "CAÑO", ["20X20", "30X30", "40X40", "50X50", "60X40", "100X50"]),
+    ("TUBO REDONDO", "TUBO", ["1/2", "3/4", "1", "1 1/4", "2"]),
+    ("MALLA SIMA", "MALLA", ["15X15 4.2MM", "15X15 6MM", "20X20 4.2MM"]),
+    ("CLAVOS PUNTA PARIS", "CLAVOS", ["1 1/2", "2", "2 1/2", "3", "4"]),
+    ("ALAMBRE RECOCIDO", "ALAMBRE", ["N14", "N16", "N17"]),
+    ("PINTURA ANTIOXIDO", "PINTURA", ["1L", "4L", "20L"]),
+    ("ELECTRODO", "ELECTRODO", ["2.5MM", "3.25MM", "4MM"]),
+    ("BULON", "ACCESORIO", ["1/4", "5/16", "3/8", "1/2"]),
+]
+MARCAS = ["ACINDAR", "SIDERSA", "GERDAU", "TERNIUM", "CINTOLO", "GENERICO"]
+
+def catalogo_sintetico(n, semilla=0):
+    """CSV con n filas parecidas a la planilla real (código, producto, tipo, precio en USD con formatos mezclados)."""
+    azar = random.Random(semilla)
+    filas, vistos = ["CODIGO,PRODUCTO,TIPO,PRECIO USD"], set()
+    i = 0
+    while len(filas) <= n:
+        familia, tipo, medidas = FAMILIAS[i % len(FAMILIAS)]
+        medida, marca = medidas[(i // len(FAMILIAS)) % len(medidas)], MARCAS[(i // 7) % len(MARCAS)]
+        # Pasadas las combinaciones básicas se agrega una variante numerada (como las planillas grandes)
+        variante = f" V{i // (len(FAMILIAS) * 60)}" if i >= len(FAMILIAS) * 60 else ""
+        nombre = f"{familia} {medida} {marca}{variante}"
+        i += 1
+        if nombre in vistos: continue
+        vistos.add(nombre)
+        precio = azar.uniform(0.5, 400)
+        texto = f"{precio:.2f}" if azar.random() < 0.7 else f'"{precio:,.2f}"'.replace(",", "X").replace(".", ",").replace("X", ".")
+        filas.append(f"P{len(filas):06d},{nombre},{tipo},{texto}")
+    return "\n".join(filas) + "\n"
+
+def productos_de(csv_texto):
+    # (nombre, tipo) de cada fila, para que el modelo falso pida cosas que existen
+    return [tuple(linea.split(",")[1:3]) for linea in csv_texto.splitlines()[1:]]
+
+class PlanillaLocal:
+    """Sirve un CSV por HTTP como la planilla publicada de Google (con ETag y 304)."""
+
+    def __init__(self, csv_texto):
+        cuerpo = csv_texto.encode("utf-8")
+        etag = '"%s"' % hashlib.md5(cuerpo).hexdigest()
+
+        class Manejador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Type", "text/csv; charset=utf-8")
+                self.send_header("Content-Length", str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def log_message(self, *a): pass
+
+        self.servidor = ThreadingHTTPServer(("127.0.0.1", 0), Manejador)
+        self.url = f"http://127.0.0.1:{self.servidor.server_address[1]}/"
+        threading.Thread(target=self.servidor.serve_forever, name="planilla-local", daemon=True).start()
+
+    def cerrar(self):
+        self.servidor.shutdown()
@@ -0,0 +1,344 @@
+# catalogo.py
+import io
+import re
+import time
+import heapq
+import bisect
+import hashlib
+import threading
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+import requests
+import streamlit as st
+from config import *
+from metricas import metricas
+from almacen import almacen
+
+# ==========================================
+# NORMALIZACIÓN DE TEXTO
+# ==========================================
+STOPWORDS = {
+    "DE", "DEL", "LA", "LAS", "EL", "LOS", "Y", "O", "A", "EN", "CON", "PARA", "POR",
+    "UN", "UNA", "UNOS", "UNAS", "QUE", "ME", "MI", "TE", "SE", "ES", "AL", "HOLA",
+    "NECESITO", "QUIERO", "PRECIO", "PRECIOS", "COTIZAME", "COTIZA", "TENES", "TENGO",
+    "HAY", "DAME", "PASAME", "CUANTO", "SALE", "VALE",
+}
+
+# Columnas que se indexan (se detectan por nombre de encabezado)
+CLAVES_NOMBRE = ("PRODUCTO", "DESCRIPCION", "NOMBRE", "ARTICULO", "DETALLE")
+CLAVES_TIPO = ("TIPO", "CATEGORIA", "RUBRO", "FAMILIA")
+CLAVES_MEDIDA = ("MEDIDA", "ESPESOR", "DIAMETRO", "CALIBRE", "LARGO", "SIZE")
+CLAVES_PRECIO = ("PRECIO", "COSTO", "VALOR", "USD", "$")
+
+_RE_TOKEN = re.compile(r"[A-Z]+|\d+(?:[.,]\d+)?")
+
+def normalizar(texto):
+    # Mayúsculas y sin acentos ("Caño" -> "CANO") para que la búsqueda no dependa del tipeo
+    texto = unicodedata.normalize("NFKD", str(texto).upper())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+def tokenizar(texto):
+    # "6mm" -> ["6", "MM"]; "1,5" -> ["1.5"]
+    return [t.replace(",", ".") for t in _RE_TOKEN.findall(normalizar(texto)) if t not in STOPWORDS]
+
+def trigramas(token):
+    t = f"#{token}#"
+    return {t[i:i + 3] for i in range(len(t) - 2)}
+
+def version_catalogo(csv_context):
+    return hashlib.md5(csv_context.encode("utf-8")).hexdigest()[:12]
+
+def detectar_columnas(df, claves):
+    return [c for c in df.columns if any(k in normalizar(c) for k in claves)]
+
+# ==========================================
+# ÍNDICE INVERTIDO (TOKENS + TRIGRAMAS)
+# ==========================================
+class IndiceCatalogo:
+    """Índice en memoria sobre nombre, tipo y medida de cada fila del catálogo."""
+
+    def __init__(self, df):
+        self.df = df.reset_index(drop=True)
+        self.columnas = (detectar_columnas(df, CLAVES_NOMBRE) + detectar_columnas(df, CLAVES_TIPO)
+                         + detectar_columnas(df, CLAVES_MEDIDA))
+        if not self.columnas:
+            # Encabezados desconocidos: se indexa todo menos los precios
+            precios = set(detectar_columnas(df, CLAVES_PRECIO))
+            self.columnas = [c for c in df.columns if c not in precios]
+        self.columnas = list(dict.fromkeys(self.columnas))
+
+        self.postings = defaultdict(set)
+        self.por_trigrama = defaultdict(set)
+        textos = []
+        if self.columnas:
+            textos = self.df[self.columnas[0]].astype(str).str.cat(self.df[self.columnas[1:]].astype(str), sep=" ")
+        for fila, texto in enumerate(textos):
+            for tok in tokenizar(texto):
+                self.postings[tok].add(fila)
+        for tok in self.postings:
+            if not tok[0].isdigit():
+                for tg in trigramas(tok):
+                    self.por_trigrama[tg].add(tok)
+
+        n = max(len(self.df), 1)
+        self.idf = {tok: 1.0 + (n / len(filas)) ** 0.5 for tok, filas in self.postings.items()}
+        self.encabezado = ",".join(self.df.columns)
+
+        # Para el buscador: vocabulario ordenado (prefijos con bisect) y filas por tipo
+        self.vocabulario = sorted(self.postings)
+        self.col_nombre = (detectar_columnas(self.df, CLAVES_NOMBRE) or list(self.df.columns[:1]) or [None])[0]
+        self.col_tipo = (detectar_columnas(self.df, CLAVES_TIPO) or [None])[0]
+        self.por_tipo = defaultdict(set)
+        if self.col_tipo:
+            for fila, tipo in enumerate(self.df[self.col_tipo].astype(str).str.strip().str.upper()):
+                if tipo: self.por_tipo[tipo].add(fila)
+        self.tipos = sorted(self.por_tipo, key=lambda t: -len(self.por_tipo[t]))
+
+    def _similares(self, token):
+        # Tokens del vocabulario parecidos (tipeos: "sincalum" ~ "CINCALUM")
+        if token in self.postings: return [(token, 1.0)]
+        if token[0].isdigit() or len(token) < 4: return []
+        tq = trigramas(token)
+        conteo = defaultdict(int)
+        for tg in tq:
+            for tok in self.por_trigrama.get(tg, ()):
+                conteo[tok] += 1
+        res = []
+        for tok, comunes in conteo.items():
+            sim = comunes / (len(tq) + len(tok) - comunes)
+            if sim >= 0.45: res.append((tok, sim))
+        return res
+
+    def filas_con(self, token):
+        # Filas que contienen el token (o uno parecido); prueba también sin plural
+        for variante in (token, token[:-1] if token.endswith("S") else None, token[:-2] if token.endswith("ES") else None):
+            if not variante: continue
+            filas = set()
+            for tok, _ in self._similares(variante):
+                filas |= self.postings[tok]
+            if filas: return filas
+        return set()
+
+    def buscar(self, texto, k=TOP_K_CATALOGO):
+        puntajes = defaultdict(float)
+        for token in set(tokenizar(texto)):
+            for tok, sim in self._similares(token):
+                peso = self.idf[tok] * sim
+                for fila in self.postings[tok]:
+                    puntajes[fila] += peso
+        return [f for f, _ in heapq.nlargest(k, puntajes.items(), key=lambda x: (x[1], -x[0]))]
+
+    def con_prefijo(self, prefijo):
+        # Filas con algún token que empieza así ("hie" -> HIERRO, HIERROS...)
+        filas = set()
+        i = bisect.bisect_left(self.vocabulario, prefijo)
+        while i < len(self.vocabulario) and self.vocabulario[i].startswith(prefijo):
+            filas |= self.postings[self.vocabulario[i]]
+            i += 1
+        return filas
+
+    def sugerir(self, texto, tipo=None, k=RESULTADOS_BUSQUEDA):
+        """Buscador mientras se escribe: la última palabra vale como prefijo, las demás exactas o parecidas."""
+        tokens = tokenizar(texto)
+        filas = set(self.por_tipo.get(tipo, ())) if tipo else None
+        for i, token in enumerate(tokens):
+            if i == len(tokens) - 1 and not texto.endswith(" "):
+                encontradas = self.con_prefijo(token) or self.filas_con(token)
+            else:
+                encontradas = self.filas_con(token)
+            filas = encontradas if filas is None else filas & encontradas
+            if not filas: return []
+        if filas is None: return []
+        return sorted(filas)[:k]
+
+    def contexto(self, texto, k=TOP_K_CATALOGO, tabla=None):
+        # tabla: el catálogo con los precios en pesos ya calculados (mismas filas que self.df)
+        filas = self.buscar(texto, k)
+        if not filas: return ""
+        return (self.df if tabla is None else tabla).iloc[sorted(filas)].to_csv(index=False)
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def obtener_indice(version, _csv_context):
+    # Se construye una sola vez por versión del catálogo (el CSV no se hashea, solo la versión)
+    with metricas().medir("etapa_segundos", etapa="indice"):
+        df = pd.read_csv(io.StringIO(_csv_context), dtype=str).fillna("")
+        return IndiceCatalogo(df)
+
+# ==========================================
+# PRECIOS EN PESOS (UNA PASADA POR COLUMNA)
+# ==========================================
+def a_numeros(serie):
+    # "$ 12.500,50" / "12500.5" / "12,500" -> float (NaN si no se puede), sobre toda la columna
+    s = serie.astype(str).str.replace(r"[^\d.,]", "", regex=True)
+    coma, punto = s.str.contains(",", regex=False), s.str.contains(".", regex=False)
+    coma_decimal = s.str.rfind(",") > s.str.rfind(".")
+    sin_puntos, sin_comas = s.str.replace(".", "", regex=False), s.str.replace(",", "", regex=False)
+    limpio = np.select(
+        [coma & punto & coma_decimal, coma & punto,
+         coma & s.str.fullmatch(r"\d{1,3}(,\d{3})+"), coma,
+         s.str.fullmatch(r"\d{1,3}(\.\d{3})+")],
+        [sin_puntos.str.replace(",", ".", regex=False), sin_comas,
+         sin_comas, s.str.replace(",", ".", regex=False),
+         sin_puntos],
+        default=s,
+    )
+    return pd.to_numeric(pd.Series(limpio, index=serie.index), errors="coerce")
+
+def columna_precio(df, columna=COLUMNA_PRECIO):
+    # La de config.py si está en la planilla; si no, la primera según el orden de CLAVES_PRECIO
+    # (una columna PRECIO gana a una COSTO aunque esté más a la derecha)
+    if columna in df.columns: return columna
+    for clave in CLAVES_PRECIO:
+        encontradas = detectar_columnas(df, (clave,))
+        if encontradas: return encontradas[0]
+    return None
+
+def en_dolares(columna, moneda=MONEDA_PRECIOS):
+    if moneda.upper() in ("USD", "ARS"): return moneda.upper() == "USD"
+    return any(k in normalizar(columna) for k in ("USD", "U$S", "DOLAR"))
+
+def tabla_precios(df, dolar):
+    """Catálogo con PRECIO_ARS (sin IVA) y PRECIO_ARS_IVA para cada fila, listos para usar."""
+    tabla = df.copy()
+    col_precio = columna_precio(df)
+    if col_precio is None:
+        tabla["PRECIO_ARS"] = np.nan
+    else:
+        tabla["PRECIO_ARS"] = (a_numeros(df[col_precio]) * (dolar if en_dolares(col_precio) else 1.0)).round(2)
+    tabla["PRECIO_ARS_IVA"] = (tabla["PRECIO_ARS"] * (1 + IVA)).round(2)
+    return tabla
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def obtener_tabla_precios(version, dolar, _df):
+    # Se recalcula solo si cambia el catálogo o el dólar
+    with metricas().medir("etapa_segundos", etapa="precios"):
+        return tabla_precios(_df, dolar)
+
+# ==========================================
+# SERVICIO DE CATÁLOGO (REFRESCO EN SEGUNDO PLANO)
+# ==========================================
+class ServicioCatalogo:
+    """Sirve siempre la última versión buena de la planilla y la revalida en un hilo aparte.
+
+    Usa ETag/Last-Modified para no bajar la planilla si no cambió y deja la copia en el
+    almacén compartido: arranca al instante después de un reinicio y, con varias réplicas,
+    la que revalida primero le ahorra la descarga a las demás.
+    """
+
+    def __init__(self, url=SHEET_URL, ttl=TTL_CATALOGO, compartido=None):
+        self.url = url
+        self.ttl = ttl
+        self.compartido = compartido or almacen()
+        self.estado = ("", "")  # (csv, versión): se reemplaza entero para que los lectores no vean mezclas
+        self.etag = None
+        self.modificado = None
+        self.actualizado = 0.0
+        self.error = None
+        self._lock = threading.Lock()
+        self._frio = threading.Lock()
+        self._refrescando = False
+        self._hilo = None
+        self._cargar_snapshot()
+
+    @property
+    def csv(self): return self.estado[0]
+
+    @property
+    def version(self): return self.estado[1]
+
+    def _cargar_snapshot(self):
+        # True si el almacén tenía una copia más nueva que la propia (y se adoptó).
+        # Se lee la ficha (chica) y el CSV solo si la versión es otra: con 100k filas son varios MB.
+        ficha = self.compartido.obtener("catalogo:ficha")
+        if not ficha or float(ficha.get("actualizado", 0)) <= self.actualizado: return False
+        if ficha.get("version") != self.version:
+            copia = self.compartido.obtener("catalogo:csv")
+            if not copia or not copia.get("csv") or copia.get("version") != ficha.get("version"): return False
+            self.estado = (copia["csv"], copia["version"])
+        self.etag, self.modificado = ficha.get("etag"), ficha.get("modificado")
+        self.actualizado = float(ficha["actualizado"])
+        return True
+
+    def _guardar_snapshot(self, con_csv=True):
+        # 304: solo se renueva la ficha; el CSV se escribe (antes que la ficha) cuando se bajó entero
+        if con_csv: self.compartido.guardar("catalogo:csv", {"version": self.version, "csv": self.csv})
+        self.compartido.guardar("catalogo:ficha", {"etag": self.etag, "modificado": self.modificado,
+                                                   "actualizado": self.actualizado, "version": self.version})
+
+    def refrescar(self):
+        """Trae la planilla si cambió (del almacén si otra réplica ya la revalidó). True si hay versión nueva."""
+        version = self.version
+        with metricas().medir("etapa_segundos", etapa="catalogo"):
+            if self._cargar_snapshot() and time.time() - self.actualizado < self.ttl: resultado = "compartida"
+            else: resultado = self._descargar()
+        metricas().contar("catalogo_descargas", resultado=resultado)
+        return self.version != version
+
+    def _descargar(self):
+        headers = {}
+        if self.csv and self.etag: headers["If-None-Match"] = self.etag
+        if self.csv and self.modificado: headers["If-Modified-Since"] = self.modificado
+        try:
+            r = requests.get(self.url, headers=headers, timeout=15)
+            if r.status_code == 304:
+                self.actualizado = time.time()
+                self._guardar_snapshot(con_csv=False)
+                return "304"
+            r.raise_for_status()
+            df = pd.read_csv(io.BytesIO(r.content), dtype=str).fillna("")
+            if df.empty: raise ValueError("planilla vacía")
+            csv_context = df.to_csv(index=False)
+        except Exception as e:
+            # Falla la descarga: se sigue sirviendo la última versión buena
+            self.error = str(e)
+            return "error"
+        self.error = None
+        self.etag, self.modificado = r.headers.get("ETag"), r.headers.get("Last-Modified")
+        self.actualizado = time.time()
+        nueva = version_catalogo(csv_context)
+        cambio = nueva != self.version
+        if cambio: self.estado = (csv_context, nueva)
+        self._guardar_snapshot()
+        return "nueva" if cambio else "igual"
+
+    def _refrescar_fondo(self):
+        with self._lock:
+            if self._refrescando: return
+            self._refrescando = True
+        def tarea():
+            try: self.refrescar()
+            finally: self._refrescando = False
+        threading.Thread(target=tarea, name="catalogo-revalidar", daemon=True).start()
+
+    def _bucle(self):
+        while True:
+            time.sleep(self.ttl)
+            self._refrescar_fondo()
+
+    def iniciar(self):
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._bucle, name="catalogo-refresco", daemon=True)
+                self._hilo.start()
+
+    def obtener(self):
+        self.iniciar()
+        if not self.csv:
+            # Arranque en frío sin copia en disco: no queda otra que esperar la descarga (una sola vez)
+            with self._frio:
+                if not self.csv: self.refrescar()
+        elif time.time() - self.actualizado > self.ttl:
+            self._refrescar_fondo()
+        return self.csv
+
+_servicio = None
+_servicio_lock = threading.Lock()
+
+def servicio_catalogo():
+    global _servicio
+    with _servicio_lock:
+        if _servicio is None: _servicio = ServicioCatalogo()
+    return _servicio
@@ -1,10 +1,34 @@
 # config.py
+import os
 
 # 🎯 METAS DE VENTA
 META_MAXIMA = 2500000
 META_MEDIA  = 1500000
 META_BASE   = 800000
 
+# 🏷️ REGLAS DE DESCUENTO (se evalúan contra los totales del carrito, sin recorrerlo)
+# Niveles: (subtotal mayor a, % descuento, nombre, color). El primero que se cumple gana.
+NIVELES_DESCUENTO = [
+    (META_MAXIMA, 15, "PARTNER MAX", "#6200ea"),
+    (META_MEDIA,  12, "CONSTRUCTOR", "#d32f2f"),
+    (META_BASE,   10, "OBRA",        "#f57c00"),
+    (None,         3, "CONTADO",     "#2e7d32"),
+]
+# Categorías por tipo de producto: ("igual" | "contiene", palabras)
+CATEGORIAS_CARRITO = {
+    "CHAPA":       ("contiene", ["CHAPA"]),
+    "PERFIL":      ("contiene", ["PERFIL"]),
+    "ACERO":       ("igual",    ["HIERRO", "MALLA", "CLAVOS", "ALAMBRE", "PERFIL", "CHAPA", "TUBO", "CAÑO"]),
+    "TERMINACION": ("contiene", ["PINTURA", "ACCESORIO", "ELECTRODO"]),
+}
+# Combos: (nombre, categorías requeridas, % extra). Se aplica solo el primero que se cumple.
+BOOSTERS_DESCUENTO = [
+    ("KIT TECHO",  ["CHAPA", "PERFIL"],      3),
+    ("PACK TERM.", ["ACERO", "TERMINACION"], 2),
+]
+TOPE_DESCUENTO = 18
+COLOR_DESCUENTO_ALTO = (15, "#6200ea")  # con booster y descuento >= 15%
+
 # ⏱️ TIEMPO CORTO
 MINUTOS_OFERTA = 3
 
@@ -12,11 +36,100 @@ MINUTOS_OFERTA = 3
 # ✅ LINK ACTUALIZADO:
 SHEET_URL = "https://docs.google.com/spreadsheets/d/e/2PACX-1vTUG5PPo2kN1HkP2FY1TNAU9-ehvXqcvE_S9VBnrtQIxS9eVNmnh6Uin_rkvnarDQ/pub?output=csv"
 URL_FORM_GOOGLE = "" 
+# 💲 PRECIOS DE LA PLANILLA: encabezado exacto y moneda. Vacío: se deduce del encabezado
+# (PRECIO antes que VALOR/COSTO; USD/U$S/DOLAR en el nombre = dólares), que no siempre alcanza.
+COLUMNA_PRECIO = os.environ.get("PB_COLUMNA_PRECIO", "")
+MONEDA_PRECIOS = os.environ.get("PB_MONEDA_PRECIOS", "USD")  # "USD" | "ARS" | ""
+
+# 🔄 REFRESCO DEL CATÁLOGO (segundos); la última copia buena queda en el almacén compartido
+TTL_CATALOGO = 600
+
+# 🔥 ARRANQUE: máximo que espera una sesión al calentamiento del proceso (segundos)
+ESPERA_ARRANQUE = 20
+
+# 🔎 CONTEXTO DE CATÁLOGO POR TURNO (filas relevantes que se mandan a la IA)
+TOP_K_CATALOGO = 25
+RESULTADOS_BUSQUEDA = 20    # filas que muestra el buscador de la pestaña CATÁLOGO
+
+# 🤖 MODELOS IA (en orden de preferencia) Y RESPALDO ANTE 429
+MODELOS_IA = [
+    "gemini-2.5-flash-image", # NUEVO: Sugerido por el error 429
+    "gemini-2.0-flash-exp",   
+    "gemini-1.5-flash",
+    "gemini-pro"
+]
+MODELO_RESPALDO = "gemini-1.5-flash"
+
+# 🚦 CUPO COMPARTIDO ENTRE TODAS LAS SESIONES (ajustar a la cuota del proyecto)
+RPM_IA = 60                 # pedidos por minuto
+RAFAGA_IA = 10              # pedidos seguidos permitidos sin esperar
+MAX_CONCURRENTES_IA = 8     # llamadas en vuelo a la vez
+MAX_COLA_IA = 40            # sesiones esperando turno; más que esto -> "servidores saturados"
+ESPERA_MAX_COLA = 45        # segundos máximos en la cola
+CIRCUITO_FALLOS = 3         # 429 seguidos para pausar un modelo
+CIRCUITO_ENFRIAMIENTO = 60  # segundos que el modelo queda pausado
+
+# ⏱️ PRESUPUESTO DE LATENCIA POR TURNO
+TIMEOUT_IA = 40             # segundos máximos esperando a la IA (después: "servidores saturados")
+TIMEOUT_CHUNK_IA = 15       # segundos máximos entre dos pedazos del stream (después se corta)
+HEDGE_PERCENTIL = 0.9       # si el modelo tarda más que su p90 se pide lo mismo al siguiente
+HEDGE_MIN = 2.0             # límites del plazo de cobertura (segundos)
+HEDGE_MAX = 12.0
+HEDGE_INICIAL = 6.0         # plazo mientras no hay suficientes mediciones
+
+# 💬 CONTEXTO POR TURNO: últimos turnos completos + resumen de lo anterior
+TURNOS_VENTANA = 6          # pares cliente/respuesta que se mandan tal cual
+MAX_TOKENS_PROMPT = 6000    # tope aproximado por turno (sin contar el prompt del sistema)
+MAX_CHARS_RESUMEN = 1500
+
+# 📜 HISTORIAL: mensajes que se dibujan por defecto (el resto con "Ver anteriores")
+MENSAJES_VISIBLES = 20
+
+# 📷 FOTOS: tamaño que realmente necesita la IA y cache de respuestas por foto idéntica
+MAX_LADO_IMAGEN = 1536      # px del lado mayor
+CALIDAD_JPEG = 82
+CACHE_IMAGENES = 256        # respuestas guardadas (todo el proceso)
+
+# ⚡ RESPUESTAS EN STREAMING (el texto aparece a medida que llega)
+STREAMING = True
+
+# 🧾 PEDIDOS DEL MODELO EN JSON (mensaje + ítems) y tolerancia de precio contra el catálogo
+SALIDA_ESTRUCTURADA = True
+TOLERANCIA_PRECIO = 0.02    # 2%: si el precio del modelo se aleja más se anota (siempre vale el del catálogo)
+
+# 📊 MÉTRICAS (#admin): rangos de los histogramas
+LIMITES_SEGUNDOS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40]
+LIMITES_TOKENS = [50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000]
+
+# 🗂️ REGISTRO DE EVENTOS (consultas, cotizaciones, carritos, checkouts) EN DISCO
+RUTA_EVENTOS = ".cache/eventos.db"
+MAX_COLA_EVENTOS = 10000    # más que esto en memoria: se descarta (nunca se frena la UI)
+LOTE_EVENTOS = 500          # filas por escritura
+INTERVALO_EVENTOS = 2.0     # segundos entre escrituras
+
+# 🗄️ ALMACÉN COMPARTIDO ENTRE RÉPLICAS (catálogo, dólar, respuestas de fotos y carritos)
+# memoria:// (solo este proceso) | sqlite:///.cache/almacen.db (misma máquina/volumen) | redis://host:6379/0 (pip install redis)
+ALMACEN_URL = os.environ.get("PB_ALMACEN", "sqlite:///.cache/almacen.db")
+RUTA_ALMACEN = ".cache/almacen.db"   # respaldo si el backend pedido no se puede usar
+PREFIJO_ALMACEN = "pb:"
+TIMEOUT_ALMACEN = 0.5       # segundos por operación contra Redis (si no responde se sigue sin él)
+TTL_DOLAR = 3600
+TTL_RESPUESTAS = 86400      # respuestas de fotos ya cotizadas
+TTL_CARRITO = 7 * 86400     # carrito guardado por navegador (cookie, no la URL)
+COOKIE_SESION = "pb_sesion"
 
 # COSTOS FIJOS
+IVA = 0.21
 COSTO_FLETE_USD = 0.85 
 CONDICION_PAGO = "Contado/Transferencia"
 
+# 📏 LARGOS DE BARRA (metros) Y PRODUCTOS QUE SE VENDEN POR METRO
+LARGOS_BARRA = {"PERFIL": 12, "ADN": 12, "CAÑO": 6.40, "CANO": 6.40, "TUBO": 6, "HIERRO": 6}
+VENTA_POR_METRO = ["CAÑO", "CANO"]
+
+# 🧮 COTIZADOR LOCAL (sin IA): confianza mínima para responder sin llamar al modelo
+UMBRAL_COTIZADOR = 1.0
+
 CIUDADES_GRATIS = [
     "EL TREBOL", "LOS CARDOS", "LAS ROSAS", "SAN GENARO", "CENTENO", "CASAS", 
     "CAÑADA ROSQUIN", "SAN VICENTE", "SAN MARTIN DE LAS ESCOBAS", "ANGELICA", 
@@ -26,4 +139,5 @@ CIUDADES_GRATIS = [
     "PIAMONTE", "VILA", "SAN FRANCISCO"
 ]
 
+AVISO_CORTE = "⚠️ La respuesta se cortó a la mitad y no sumé nada al carrito: repetí el pedido."
 TOASTS_EXITO = ["🔥 ¡PRECIO CONGELADO!", "💰 ¡AHORRO ACTIVADO!", "📦 ¡STOCK RESERVADO!", "🚀 ¡VAMOS!"]
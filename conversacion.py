@@ -0,0 +1,68 @@
+# conversacion.py
+import re
+from config import *
+from ordenes import texto_de
+
+# ==========================================
+# CONTEXTO ACOTADO (VENTANA + RESUMEN)
+# ==========================================
+# Las filas de la DB van después de este separador; solo se mandan en el mensaje actual
+SEPARADOR_DB = "\n[DB]\n"
+_RE_TAG_ADD = re.compile(r"\[ADD:.*?\]")
+
+def estimar_tokens(texto):
+    return len(texto) // 4 + 1
+
+def _texto(parte):
+    # Respuestas JSON del modelo: solo el mensaje (el pedido ya está en el carrito)
+    return texto_de(parte) if isinstance(parte, str) else "[foto enviada]"
+
+def compactar_mensaje(msg):
+    # Turnos viejos: sin filas de la DB ni imágenes (ya no hacen falta para seguir la charla)
+    return {"role": msg["role"], "parts": [_texto(p).split(SEPARADOR_DB)[0] for p in msg["parts"]]}
+
+def tokens_mensaje(msg):
+    return sum(estimar_tokens(_texto(p)) for p in msg["parts"])
+
+class GestorConversacion:
+    """Arma lo que se manda a la IA: resumen de lo viejo + últimos turnos + mensaje nuevo.
+
+    El costo por turno queda fijo aunque la charla sea larga.
+    """
+
+    def __init__(self, turnos=TURNOS_VENTANA, max_tokens=MAX_TOKENS_PROMPT, max_resumen=MAX_CHARS_RESUMEN):
+        self.turnos = turnos
+        self.max_tokens = max_tokens
+        self.max_resumen = max_resumen
+        self.resumen = []
+
+    def _resumir(self, msg):
+        quien = "CLIENTE" if msg["role"] == "user" else "MIGUEL"
+        # Los [ADD:...] no van: el carrito actual viaja aparte
+        texto = _RE_TAG_ADD.sub("", " ".join(compactar_mensaje(msg)["parts"])).replace("\n", " ").strip()
+        self.resumen.append(f"{quien}: {texto[:160]}")
+        while sum(len(r) for r in self.resumen) > self.max_resumen: self.resumen.pop(0)
+
+    def _contexto(self, carrito):
+        if not self.resumen and not carrito: return []
+        texto = "RESUMEN DE LA CHARLA ANTERIOR:\n" + "\n".join(self.resumen) if self.resumen else ""
+        if carrito: texto += f"\nCARRITO ACTUAL DEL CLIENTE:\n{carrito}"
+        return [{"role": "user", "parts": [texto.strip()]}, {"role": "model", "parts": ["Entendido."]}]
+
+    def compactar(self, history, nuevo, carrito=""):
+        """Pasa al resumen lo que no entra (ventana de turnos y tope de tokens). Devuelve lo que queda."""
+        limite = self.turnos * 2
+        while len(history) > limite:
+            self._resumir(history[0])
+            history = history[1:]
+        # Tope de tokens: se pasan al resumen los turnos más viejos de a pares (cliente + respuesta)
+        while history:
+            usados = sum(tokens_mensaje(m) for m in self._contexto(carrito) + [nuevo])
+            usados += sum(tokens_mensaje(compactar_mensaje(m)) for m in history)
+            if usados <= self.max_tokens: break
+            for msg in history[:2]: self._resumir(msg)
+            history = history[2:]
+        return history
+
+    def armar(self, history, nuevo, carrito=""):
+        return self._contexto(carrito) + [compactar_mensaje(m) for m in history] + [nuevo]
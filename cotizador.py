@@ -0,0 +1,122 @@
+# cotizador.py
+import re
+import math
+from config import *
+from catalogo import normalizar, tokenizar, detectar_columnas, CLAVES_NOMBRE, CLAVES_TIPO
+
+# ==========================================
+# COTIZADOR LOCAL (PEDIDOS SIMPLES SIN IA)
+# ==========================================
+# Palabras de relleno que no describen producto ("hola, porfa cotizame...")
+RELLENO = {
+    "PORFA", "FAVOR", "GRACIAS", "BUEN", "BUENAS", "BUENOS", "DIA", "DIAS", "TARDES", "NOCHES",
+    "COTIZAR", "COTIZACION", "PASAS", "MANDAME", "ENVIAME", "NECESITARIA", "SERIA", "TENDRAS",
+    "TIENEN", "TENDRIAN", "AGREGA", "AGREGAME", "SUMA", "SUMAME", "LLEVO", "ANOTAME",
+}
+UNIDADES_METRO = {"M", "MT", "MTS", "METRO", "METROS", "ML"}
+UNIDADES_PIEZA = {"U", "UN", "UNID", "UNIDAD", "UNIDADES", "BARRA", "BARRAS", "TIRA", "TIRAS", "PIEZA", "PIEZAS", "X"}
+UNIDADES_MEDIDA = {"MM", "CM", "PULGADA", "PULGADAS"}
+
+_RE_SEPARADOR = re.compile(r"[,;+\n]|\bY\b|\bE\b")
+_RE_MEDIDA = re.compile(r"(\d+(?:[.,]\d+)?)\s*(?:MM|\"|PULGADAS?)|\bDEL\s+(\d+(?:[.,]\d+)?)\b")
+_RE_DIMENSION = re.compile(r"\d+(?:[.,]\d+)?(?:\s*X\s*\d+(?:[.,]\d+)?)+")
+_RE_CANTIDAD = re.compile(r"(\d+(?:[.,]\d+)?)\s*([A-Z]*)")
+_RE_AREA = re.compile(r"\d\s*(?:M2|MTS2|M²|METROS CUADRADOS)")
+
+class Cotizacion:
+    def __init__(self, texto, items, confianza):
+        self.texto = texto
+        self.items = items
+        self.confianza = confianza
+
+def _segmentos(texto):
+    # "hierros de 6mm, 8mm y 10mm" -> ["HIERROS DE 6MM", "8MM", "10MM"]
+    return [s.strip() for s in _RE_SEPARADOR.split(normalizar(texto)) if s.strip()]
+
+def _leer_segmento(seg):
+    medidas = []
+    # "perfil c 100x50": son medidas, no una cantidad de 100
+    for m in _RE_DIMENSION.finditer(seg):
+        medidas += [n.replace(",", ".") for n in re.findall(r"\d+(?:[.,]\d+)?", m.group())]
+    seg = _RE_DIMENSION.sub(" ", seg)
+    for m in _RE_MEDIDA.finditer(seg):
+        medidas.append((m.group(1) or m.group(2)).replace(",", "."))
+    sin_medidas = _RE_MEDIDA.sub(" ", seg)
+
+    cantidad, unidad = None, None
+    m = _RE_CANTIDAD.search(sin_medidas)
+    if m:
+        cantidad = float(m.group(1).replace(",", "."))
+        u = m.group(2)
+        unidad = "METRO" if u in UNIDADES_METRO else "PIEZA"
+        # Se saca el número (y la unidad); si lo que sigue es el producto ("10 hierros") queda
+        sigue = "" if u in UNIDADES_METRO or u in UNIDADES_PIEZA else u
+        sin_medidas = f"{sin_medidas[:m.start()]} {sigue} {sin_medidas[m.end():]}"
+
+    palabras = [t for t in tokenizar(sin_medidas)
+                if not t[0].isdigit() and t not in RELLENO and t not in UNIDADES_METRO
+                and t not in UNIDADES_PIEZA and t not in UNIDADES_MEDIDA]
+    return palabras, medidas, cantidad, unidad
+
+def _tipo_de(palabras, fila_tipo):
+    for t in [normalizar(fila_tipo)] + palabras:
+        for clave in LARGOS_BARRA:
+            if normalizar(clave) in t: return normalizar(clave)
+    return normalizar(fila_tipo) or (palabras[0] if palabras else "")
+
+def cotizar(texto, indice, tabla):
+    """Arma la cotización sin IA. Devuelve None si el pedido no es claro (lo resuelve el modelo)."""
+    if _RE_AREA.search(normalizar(texto)): return None  # "techo de 40m2": hay que calcular, va a la IA
+    df = indice.df
+    col_nombre = (detectar_columnas(df, CLAVES_NOMBRE) or list(df.columns[:1]))[0]
+    col_tipo = (detectar_columnas(df, CLAVES_TIPO) or [None])[0]
+    precios = tabla["PRECIO_ARS"]  # ya en pesos (tabla_precios), mismas filas que indice.df
+
+    lineas, items, pedidos, resueltos = [], [], 0, 0
+    palabras_prev = []
+    for seg in _segmentos(texto):
+        palabras, medidas, cantidad, unidad = _leer_segmento(seg)
+        if not palabras and not medidas: continue  # "hola", "gracias"
+        if not palabras: palabras = palabras_prev  # "8mm" hereda "hierros" del segmento anterior
+        palabras_prev = palabras
+        pedidos += 1
+
+        candidatas = None
+        for token in palabras + medidas:
+            filas = indice.filas_con(token)
+            candidatas = filas if candidatas is None else candidatas & filas
+            if not candidatas: break
+        if not candidatas or len(candidatas) != 1: continue  # sin match o ambiguo
+
+        fila = df.iloc[next(iter(candidatas))]
+        precio = precios.iat[fila.name]
+        if not precio or precio != precio: continue  # vacío o NaN
+        nombre = str(fila[col_nombre]).strip()
+        tipo = _tipo_de(palabras, fila[col_tipo] if col_tipo else "")
+        tipo_tag = str(fila[col_tipo]).strip().upper() if col_tipo and str(fila[col_tipo]).strip() else tipo
+
+        if cantidad is None:
+            lineas.append(f"▪ {nombre}: ${precio:,.0f}")
+            resueltos += 1
+            continue
+        if tipo in [normalizar(t) for t in VENTA_POR_METRO]:
+            # Caños: se venden por metro; "3 caños" son 3 barras de 6.40m
+            if unidad != "METRO": cantidad = round(cantidad * LARGOS_BARRA.get(tipo, 1), 2)
+            detalle = f"{cantidad:g} m"
+        elif unidad == "METRO":
+            if tipo not in LARGOS_BARRA: continue  # "chapa 6m": ¿largo o cantidad? lo resuelve la IA
+            metros = cantidad
+            cantidad = math.ceil(metros / LARGOS_BARRA[tipo])
+            detalle = f"{cantidad:g} barras de {LARGOS_BARRA[tipo]:g}m ({metros:g} m)"
+        else:
+            detalle = f"{cantidad:g}"
+        resueltos += 1
+        subtotal = cantidad * precio
+        lineas.append(f"▪ {detalle} x {nombre}: ${precio:,.0f} c/u = ${subtotal:,.0f}")
+        items.append(f"[ADD:{cantidad:g}:{nombre.replace(':', ' ')}:{precio:.2f}:{tipo_tag}]")
+
+    confianza = resueltos / pedidos if pedidos else 0
+    if not lineas: return Cotizacion("", [], 0)
+    texto_resp = "Listo, te paso los precios (+IVA):\n" + "\n".join(lineas)
+    if items: texto_resp += "\n\n¡Ya te lo sumé al pedido! ⏳ El precio queda congelado." + "\n" + "".join(items)
+    return Cotizacion(texto_resp, items, confianza)
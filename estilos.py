@@ -1,31 +1,25 @@
 # estilos.py
+import json
 import streamlit as st
-import streamlit.components.v1 as components 
+import streamlit.components.v1 as components
+from config import *
 
-def cargar_estilos(color_barra, porcentaje_barra, color_timer, reloj_python, display_badge, subtext_badge, display_precio, display_iva, seg_restantes, generar_link_wa, total_final, oferta_viva):
-    
-    # Colores más "MP" (Azules y Celestes salvo urgencia extrema)
-    if oferta_viva:
-        btn_bg = "linear-gradient(90deg, #009EE3, #0072CE)" # Azul MP
-        shadow_color = "rgba(0, 158, 227, 0.4)"
-    else:
-        btn_bg = "#ccc"
-        shadow_color = "rgba(0,0,0,0.1)"
-
-    header_html = f"""
-    <style>
+# ==========================================
+# PARTE ESTÁTICA (SE INYECTA UNA VEZ POR SESIÓN)
+# ==========================================
+ESTILOS_CSS = """
     /* LIMPIEZA GENERAL */
-    #MainMenu, footer, header {{ visibility: hidden !important; }}
-    [data-testid="stToolbar"] {{ display: none !important; }}
-    .block-container {{ padding-top: 110px !important; padding-bottom: 140px !important; }}
-    [data-testid="stSidebar"] {{ display: none; }} 
+    #MainMenu, footer, header { visibility: hidden !important; }
+    [data-testid="stToolbar"] { display: none !important; }
+    .block-container { padding-top: 110px !important; padding-bottom: 140px !important; }
+    [data-testid="stSidebar"] { display: none; }
 
     /* CHAT FLOTANTE "CÁPSULA" (ESTILO MP/WHATSAPP) */
-    [data-testid="stBottomBlock"], [data-testid="stChatInput"] {{ 
-        background: transparent !important; 
+    [data-testid="stBottomBlock"], [data-testid="stChatInput"] {
+        background: transparent !important;
         padding-bottom: 10px !important;
-    }}
-    .stChatInputContainer {{
+    }
+    .stChatInputContainer {
         border-radius: 25px !important;
         border: 1px solid #ddd !important;
         box-shadow: 0 4px 15px rgba(0,0,0,0.08) !important;
@@ -33,89 +27,161 @@ def cargar_estilos(color_barra, porcentaje_barra, color_timer, reloj_python, dis
         margin-bottom: 10px;
         width: 95% !important;
         margin-left: auto; margin-right: auto;
-    }}
-    .stChatInputContainer textarea {{ padding-top: 12px !important; }}
+    }
+    .stChatInputContainer textarea { padding-top: 12px !important; }
 
     /* HEADER LIMPIO */
-    .fixed-header {{ 
-        position: fixed; top: 0; left: 0; width: 100%; 
-        background: rgba(255, 255, 255, 0.95); 
+    .fixed-header {
+        position: fixed; top: 0; left: 0; width: 100%;
+        background: rgba(255, 255, 255, 0.95);
         backdrop-filter: blur(10px);
-        z-index: 99990; 
-        height: 85px; 
+        z-index: 99990;
+        height: 85px;
         border-bottom: 1px solid #f0f0f0;
-    }}
-    
+        font-family: "Source Sans Pro", sans-serif;
+    }
+
     /* ORGANIZACIÓN HEADER */
-    .header-grid {{ display: grid; grid-template-columns: 1fr auto; padding: 10px 20px; align-items: center; }}
-    
-    .brand-text {{ font-size: 0.75rem; color: #888; letter-spacing: 1px; font-weight: 600; text-transform: uppercase; }}
-    
+    .header-grid { display: grid; grid-template-columns: 1fr auto; padding: 10px 20px; align-items: center; }
+
+    .brand-text { font-size: 0.75rem; color: #888; letter-spacing: 1px; font-weight: 600; text-transform: uppercase; }
+
     /* PRECIO GRANDE Y LIMPIO */
-    .price-big {{ font-size: 1.8rem; font-weight: 800; color: #333; letter-spacing: -1px; }}
-    .iva-small {{ font-size: 0.8rem; color: #999; font-weight: 400; }}
+    .price-big { font-size: 1.8rem; font-weight: 800; color: #333; letter-spacing: -1px; }
+    .iva-small { font-size: 0.8rem; color: #999; font-weight: 400; }
 
     /* TIMER TIPO "ETIQUETA" */
-    .timer-pill {{ 
-        background: #f5f5f5; color: #333; 
-        padding: 4px 12px; border-radius: 20px; 
-        font-weight: 700; font-size: 0.85rem; 
+    .timer-pill {
+        background: #f5f5f5; color: #333;
+        padding: 4px 12px; border-radius: 20px;
+        font-weight: 700; font-size: 0.85rem;
         display: inline-flex; align-items: center; gap: 5px;
         border: 1px solid #eee;
-    }}
-    .timer-pill.urgent {{ background: #ffebee; color: #d32f2f; border-color: #ffcdd2; }}
+    }
+    .timer-pill.urgent { background: #ffebee; color: #d32f2f; border-color: #ffcdd2; }
 
     /* BARRA PROGRESO FINA */
-    .progress-line {{ position: absolute; bottom: 0; left: 0; height: 3px; background: {color_barra}; width: {porcentaje_barra}%; transition: width 0.5s; }}
+    .progress-line { position: absolute; bottom: 0; left: 0; height: 3px; width: 0; transition: width 0.5s; }
 
     /* BOTÓN FLOTANTE (+) */
-    div[data-testid="stPopover"] button {{
+    div[data-testid="stPopover"] button {
         border-radius: 50%; width: 50px; height: 50px;
         background-color: #009EE3; color: white; border: none;
         box-shadow: 0 4px 12px rgba(0, 158, 227, 0.4);
-    }}
-    </style>
-    
+    }
+
+    /* BOTON PAGAR (Estilo MP: Azul, Redondo, Sombra suave) */
+    .pagar-wrap { position:fixed; bottom:85px; right:15px; left:15px; z-index:200000; display:none; justify-content:center; }
+    .pagar-wrap a {
+        background: linear-gradient(90deg, #009EE3, #0072CE); color: white;
+        padding: 16px; border-radius: 30px; width: 100%; text-align:center;
+        font-weight: 600; text-decoration: none;
+        box-shadow: 0 8px 20px rgba(0, 158, 227, 0.4);
+        font-size: 1.1rem; letter-spacing: 0.5px;
+        font-family: "Source Sans Pro", sans-serif;
+    }
+"""
+
+HEADER_HTML = """
     <div class="fixed-header">
         <div class="header-grid">
             <div>
                 <div class="brand-text">Pedro Bravin S.A.</div>
-                <div class="price-big">{display_precio}<span class="iva-small">{display_iva}</span></div>
+                <div class="price-big"><span id="pb-precio"></span><span id="pb-iva" class="iva-small"></span></div>
             </div>
             <div style="text-align:right;">
-                <div class="{ 'timer-pill urgent' if seg_restantes < 60 else 'timer-pill' }">
-                    ⏰ {reloj_python}
-                </div>
-                <div style="font-size:0.7rem; color:{color_barra}; font-weight:700; margin-top:5px;">
-                    {subtext_badge}
-                </div>
+                <div id="pb-timer" class="timer-pill">⏰ <span id="pb-reloj">--:--</span></div>
+                <div id="pb-sub" style="font-size:0.7rem; font-weight:700; margin-top:5px;"></div>
             </div>
         </div>
-        <div class="progress-line"></div>
+        <div id="pb-barra" class="progress-line"></div>
     </div>
-    <script>
-    (function() {{
-        var duration = {seg_restantes};
-        // Lógica simple de timer visual (sin actualizar DOM complejo para mantenerlo limpio)
-    }})();
-    </script>
-    """
-    st.markdown(header_html, unsafe_allow_html=True)
-    
-    # BOTON PAGAR (Estilo MP: Azul, Redondo, Sombra suave)
-    if len(st.session_state.cart) > 0 and oferta_viva:
-        st.markdown(f"""
-        <div style="position:fixed; bottom:85px; right:15px; left:15px; z-index:200000; display:flex; justify-content:center;">
-            <a href="{generar_link_wa(total_final)}" target="_blank" style="
-                background: {btn_bg}; color: white; 
-                padding: 16px; border-radius: 30px; width: 100%; text-align:center;
-                font-weight: 600; text-decoration: none; 
-                box-shadow: 0 8px 20px {shadow_color};
-                font-size: 1.1rem; letter-spacing: 0.5px;">
-                Pagar ${total_final:,.0f}
-            </a>
-        </div>
-        """, unsafe_allow_html=True)
+    <div id="pb-pagar-wrap" class="pagar-wrap"><a id="pb-pagar" target="_blank"></a></div>
+"""
+
+# Corre en la página (no en el iframe): el timer cuenta solo, sin reruns de Python
+SCRIPT_BASE = """
+(function() {
+    var d = document;
+    function set(id, f) { var e = d.getElementById(id); if (e) f(e); }
+    function tic() {
+        var x = window.pbEstado; if (!x || x.fin === undefined) return;
+        var seg = Math.max(0, Math.round((x.fin - Date.now()) / 1000));
+        var m = Math.floor(seg / 60), s = seg % 60;
+        set("pb-reloj", function(e) { e.textContent = (m < 10 ? "0" : "") + m + ":" + (s < 10 ? "0" : "") + s; });
+        set("pb-timer", function(e) { e.className = seg < 60 ? "timer-pill urgent" : "timer-pill"; });
+    }
+    window.pbActualizar = function(x) {
+        var prev = window.pbEstado || {};
+        // El fin de la oferta solo se recalcula si cambió el vencimiento (evita saltos del reloj)
+        if (x.seg !== undefined) x.fin = (prev.exp === x.exp && prev.fin !== undefined) ? prev.fin : Date.now() + x.seg * 1000;
+        else { x.fin = prev.fin; x.exp = prev.exp; }
+        window.pbEstado = x;
+        set("pb-precio", function(e) { e.textContent = x.precio; });
+        set("pb-iva", function(e) { e.textContent = x.iva; });
+        set("pb-sub", function(e) { e.textContent = x.sub; e.style.color = x.color; });
+        set("pb-barra", function(e) { e.style.width = x.barra + "%"; e.style.background = x.color; });
+        set("pb-pagar", function(e) { e.textContent = x.pagar; e.href = x.link; });
+        set("pb-pagar-wrap", function(e) { e.style.display = x.visible ? "flex" : "none"; });
+        d.querySelectorAll('button[data-baseweb="tab"] p').forEach(function(p) {
+            if (p.textContent.indexOf("MI PEDIDO") >= 0) p.textContent = "🛒 MI PEDIDO (" + x.items + ")";
+        });
+        tic();
+    };
+    if (!window.pbTimer) window.pbTimer = setInterval(tic, 1000);
+    if (window.pbPendiente) { window.pbActualizar(window.pbPendiente); window.pbPendiente = null; }
+})();
+"""
+
+def _inyectar_base():
+    # Estilos, header y script quedan en la página (fuera del árbol de Streamlit): sobreviven a los reruns
+    components.html(f"""<script>(function(){{
+        var d = window.parent.document;
+        if (d.getElementById("pb-estilos")) return;
+        var css = d.createElement("style"); css.id = "pb-estilos"; css.textContent = {json.dumps(ESTILOS_CSS)};
+        d.head.appendChild(css);
+        var div = d.createElement("div"); div.innerHTML = {json.dumps(HEADER_HTML)};
+        while (div.firstElementChild) d.body.appendChild(div.firstElementChild);
+        var s = d.createElement("script"); s.textContent = {json.dumps(SCRIPT_BASE)};
+        d.head.appendChild(s);
+    }})();</script>""", height=0)
+
+def _enviar_estado(datos):
+    # Lo único que viaja en cada rerun: unos pocos valores del header
+    components.html(f"""<script>(function(){{
+        var w = window.parent, x = {json.dumps(datos)};
+        if (w.pbActualizar) w.pbActualizar(x); else w.pbPendiente = x;
+    }})();</script>""", height=0)
+
+def cargar_estilos(color_barra, porcentaje_barra, color_timer, reloj_python, display_badge, subtext_badge, display_precio, display_iva, seg_restantes, generar_link_wa, total_final, oferta_viva):
+    if not st.session_state.get("estilos_cargados"):
+        _inyectar_base()
+        st.session_state.estilos_cargados = True
+
+    items = len(st.session_state.cart)
+    _enviar_estado({
+        "precio": display_precio, "iva": display_iva, "sub": subtext_badge, "color": color_barra,
+        "barra": porcentaje_barra, "pagar": f"Pagar ${total_final:,.0f}",
+        "link": generar_link_wa(total_final) if items else "", "items": items, "visible": items > 0 and oferta_viva,
+        "seg": max(seg_restantes, 0), "exp": str(st.session_state.expiry_time),
+    })
+
+def refrescar_header(display_precio, display_iva, subtext_badge, color_barra, porcentaje_barra, total_final, link_wa, items, oferta_viva):
+    # Desde un fragmento no se puede redibujar el header: se mandan solo los valores nuevos
+    _enviar_estado({
+        "precio": display_precio, "iva": display_iva, "sub": subtext_badge, "color": color_barra,
+        "barra": porcentaje_barra, "pagar": f"Pagar ${total_final:,.0f}", "link": link_wa,
+        "items": items, "visible": items > 0 and oferta_viva,
+    })
 
 def auto_scroll():
-    components.html("""<script>setInterval(function(){var b=window.parent.document.querySelector(".main");if(b)b.scrollTop=b.scrollHeight;},800);</script>""", height=0)
+    # Se instala una sola vez por sesión, en la página (antes era un iframe nuevo con setInterval en cada rerun)
+    if st.session_state.get("scroll_instalado"): return
+    st.session_state.scroll_instalado = True
+    components.html("""<script>(function(){var w=window.parent;if(w.pbScroll)return;var s=w.document.createElement("script");s.textContent='window.pbScroll=setInterval(function(){var b=document.querySelector(".main");if(b)b.scrollTop=b.scrollHeight;},800);';w.document.head.appendChild(s);})();</script>""", height=0)
+
+def recordar_sesion(sesion_id, segundos=TTL_CARRITO):
+    # Cookie de este navegador con el id del carrito: no va en la URL, así compartir el link no comparte el carrito
+    if st.session_state.get("cookie_sesion") == sesion_id: return
+    st.session_state.cookie_sesion = sesion_id
+    components.html(f"""<script>window.parent.document.cookie = "{COOKIE_SESION}={sesion_id}; path=/; max-age={int(segundos)}; SameSite=Lax";</script>""", height=0)
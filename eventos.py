@@ -0,0 +1,130 @@
+# eventos.py
+import os
+import json
+import hashlib
+import time
+import queue
+import atexit
+import sqlite3
+import threading
+from config import *
+from metricas import metricas
+
+# ==========================================
+# REGISTRO DE EVENTOS (ESCRITURA DIFERIDA EN SQLITE)
+# ==========================================
+def anonimizar(sesion):
+    # El id de sesión sirve para recuperar el carrito: al log va solo un hash (alcanza para agrupar)
+    return hashlib.sha256(sesion.encode()).hexdigest()[:12] if sesion else None
+
+class RegistroEventos:
+    """Log de solo-agregar: la UI encola y sigue; un hilo escribe en lotes.
+
+    La cola es acotada: si el disco no da abasto se descartan eventos (y se cuentan)
+    antes que frenar un rerun.
+    """
+
+    def __init__(self, ruta=RUTA_EVENTOS, max_cola=MAX_COLA_EVENTOS, lote=LOTE_EVENTOS, intervalo=INTERVALO_EVENTOS):
+        self.ruta = ruta
+        self.lote = lote
+        self.intervalo = intervalo
+        self.cola = queue.Queue(maxsize=max_cola)
+        self.escritos = 0
+        self.descartados = 0
+        self.error = None
+        self._despertar = threading.Event()
+        self._hilo = None
+        self._lock = threading.Lock()
+
+    def iniciar(self):
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._bucle, name="eventos", daemon=True)
+                self._hilo.start()
+                atexit.register(self.vaciar)
+
+    def registrar(self, tipo, sesion=None, **datos):
+        """No bloquea: si la cola está llena el evento se descarta."""
+        self.iniciar()
+        try:
+            self.cola.put_nowait((time.time(), tipo, anonimizar(sesion), json.dumps(datos, ensure_ascii=False, default=str)))
+        except queue.Full:
+            self.descartados += 1
+            metricas().contar("eventos_descartados")
+            return False
+        # Con medio lote esperando no se espera al intervalo
+        if self.cola.qsize() >= self.lote // 2: self._despertar.set()
+        return True
+
+    def _conectar(self):
+        os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+        con = sqlite3.connect(self.ruta, timeout=10)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute("CREATE TABLE IF NOT EXISTS eventos (id INTEGER PRIMARY KEY, ts REAL, tipo TEXT, sesion TEXT, datos TEXT)")
+        con.execute("CREATE INDEX IF NOT EXISTS eventos_tipo_ts ON eventos (tipo, ts)")
+        return con
+
+    def _sacar_lote(self):
+        filas = []
+        while len(filas) < self.lote:
+            try: filas.append(self.cola.get_nowait())
+            except queue.Empty: break
+        return filas
+
+    def _escribir(self, con, filas):
+        t0 = time.perf_counter()
+        with con: con.executemany("INSERT INTO eventos (ts, tipo, sesion, datos) VALUES (?, ?, ?, ?)", filas)
+        self.escritos += len(filas)
+        metricas().observar("etapa_segundos", time.perf_counter() - t0, etapa="eventos")
+        metricas().contar("eventos_escritos", len(filas))
+
+    def _bucle(self):
+        con = None
+        while True:
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+            try:
+                if con is None: con = self._conectar()
+                while True:
+                    filas = self._sacar_lote()
+                    if not filas: break
+                    self._escribir(con, filas)
+                self.error = None
+            except Exception as e:
+                # Disco lleno / bloqueado: lo que no se pudo escribir se pierde, el hilo sigue
+                self.error = str(e)
+                metricas().contar("eventos_errores")
+                con = None
+
+    def vaciar(self):
+        # Al cerrar el proceso: lo que quedó en la cola va al disco en el hilo que llama
+        filas = self._sacar_lote()
+        if not filas: return
+        try:
+            con = self._conectar()
+            while filas:
+                self._escribir(con, filas)
+                filas = self._sacar_lote()
+            con.close()
+        except Exception as e:
+            self.error = str(e)
+
+    def recientes(self, n=200):
+        # Solo para el admin (abre su propia conexión de lectura)
+        if not os.path.exists(self.ruta): return []
+        con = sqlite3.connect(self.ruta, timeout=5)
+        try:
+            filas = con.execute("SELECT ts, tipo, sesion, datos FROM eventos ORDER BY id DESC LIMIT ?", (n,)).fetchall()
+        finally:
+            con.close()
+        return [{"Fecha": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts)), "Tipo": tipo, "Sesión": sesion, "Datos": datos}
+                for ts, tipo, sesion, datos in filas]
+
+    def estado(self):
+        return {"en_cola": self.cola.qsize(), "escritos": self.escritos, "descartados": self.descartados, "error": self.error}
+
+_registro = RegistroEventos()
+
+def registro_eventos():
+    return _registro
@@ -0,0 +1,203 @@
+# flete.py
+import re
+from collections import defaultdict
+from config import *
+from catalogo import normalizar, trigramas
+
+# ==========================================
+# DISTANCIAS DESDE EL DEPÓSITO (EL TRÉBOL, SANTA FE)
+# ==========================================
+# km por ruta, aproximados (redondeados a 5 km). Editar acá si cambia el recorrido.
+DISTANCIAS_KM = {
+    # Zona gratis
+    "EL TREBOL": 0, "LOS CARDOS": 20, "LAS ROSAS": 35, "SAN GENARO": 65, "CENTENO": 55,
+    "CASAS": 45, "CAÑADA ROSQUIN": 25, "SAN VICENTE": 95, "SAN MARTIN DE LAS ESCOBAS": 40,
+    "ANGELICA": 85, "SUSANA": 95, "RAFAELA": 110, "SUNCHALES": 150, "PRESIDENTE ROCA": 105,
+    "SA PEREIRA": 90, "CLUCELLAS": 60, "MARIA JUANA": 50, "SASTRE": 45, "SAN JORGE": 35,
+    "LAS PETACAS": 50, "ZENON PEREYRA": 65, "CARLOS PELLEGRINI": 20, "LANDETA": 30,
+    "MARIA SUSANA": 25, "PIAMONTE": 35, "VILA": 90, "SAN FRANCISCO": 130,
+    # Santa Fe
+    "TRAILL": 15, "BOUQUET": 45, "MONTES DE OCA": 40, "TORTUGAS": 60, "LAS PAREJAS": 60,
+    "ARMSTRONG": 75, "TOTORAS": 75, "CAÑADA DE GOMEZ": 60, "CORREA": 75, "CARCARAÑA": 95,
+    "ROLDAN": 115, "FUNES": 125, "ROSARIO": 140, "SAN LORENZO": 135, "CAPITAN BERMUDEZ": 140,
+    "VILLA GOBERNADOR GALVEZ": 150, "CASILDA": 120, "FIRMAT": 150, "VENADO TUERTO": 200,
+    "VILLA CONSTITUCION": 195, "GALVEZ": 80, "SAN CARLOS CENTRO": 115, "CORONDA": 115,
+    "ESPERANZA": 135, "SANTA FE": 150, "SANTO TOME": 145, "SAN JUSTO": 240,
+    "RECONQUISTA": 440, "ATALIVA": 125, "HUMBERTO PRIMO": 150, "FRONTERA": 130,
+    "LEHMANN": 120, "ESMERALDA": 75, "SAN ANTONIO": 110, "CRISPI": 55, "COLONIA BELGRANO": 70,
+    # Córdoba
+    "MORTEROS": 175, "LAS VARILLAS": 140, "ARROYITO": 215, "LEONES": 130, "MARCOS JUAREZ": 115,
+    "BELL VILLE": 160, "VILLA MARIA": 200, "CORDOBA": 340, "RIO TERCERO": 265, "CORRAL DE BUSTOS": 170,
+    "POZO DEL MOLLE": 170, "DEVOTO": 150, "FREYRE": 160, "EL TIO": 185, "BRINKMANN": 170,
+}
+
+# Otras formas de escribir la misma localidad
+ALIAS_LOCALIDADES = {
+    "SANTA ANA PEREIRA": "SA PEREIRA", "S A PEREIRA": "SA PEREIRA", "PEREIRA": "SA PEREIRA",
+    "CDA ROSQUIN": "CAÑADA ROSQUIN", "ROSQUIN": "CAÑADA ROSQUIN", "PTE ROCA": "PRESIDENTE ROCA",
+    "CDA DE GOMEZ": "CAÑADA DE GOMEZ", "VGG": "VILLA GOBERNADOR GALVEZ", "TREBOL": "EL TREBOL",
+    "SAN MARTIN ESCOBAS": "SAN MARTIN DE LAS ESCOBAS", "ESCOBAS": "SAN MARTIN DE LAS ESCOBAS",
+    "CORDOBA CAPITAL": "CORDOBA", "SANTA FE CAPITAL": "SANTA FE",
+}
+
+# Palabras que indican que la pregunta es por el envío
+PALABRAS_FLETE = {
+    "FLETE", "FLETES", "ENVIO", "ENVIOS", "ENVIAN", "ENVIAS", "LLEVAN", "LLEVAS", "LLEGAN", "LLEGAS",
+    "MANDAN", "MANDAS", "REPARTEN", "ENTREGAN", "ENTREGA", "DESPACHAN", "TRASLADO", "KM",
+}
+_RE_PALABRA = re.compile(r"[A-Z]+")
+_RE_TOKEN = re.compile(r"[A-Z0-9]+")
+_RELLENO_FLETE = {
+    "CUANTO", "SALE", "COSTO", "COSTARIA", "VALE", "CUESTA", "EL", "LA", "LOS", "LAS", "DE", "DEL", "A", "HASTA",
+    "PARA", "EN", "AL", "ME", "HACEN", "HACES", "TIENE", "TIENEN", "HAY", "Y", "QUE", "SI", "ES", "HOLA",
+    "GRACIAS", "POR", "FAVOR", "PORFA", "ESTOY", "SOY", "VIVO", "DESDE", "AHI", "ACA", "ZONA", "PRECIO",
+}
+# Los tipeos solo se buscan justo después de "a / para / hasta" ("envío a rafela")
+_PISTAS_LOCALIDAD = {"A", "PARA", "HASTA"}
+_ARTICULOS = {"EL", "LA", "LOS", "LAS"}
+
+def _clave(nombre):
+    # "Cañada Rosquín" -> "CANADA ROSQUIN" (sin acentos ni eñes)
+    return " ".join(_RE_PALABRA.findall(normalizar(nombre)))
+
+# ==========================================
+# ÍNDICE DE LOCALIDADES (EXACTO + TIPEOS)
+# ==========================================
+class IndiceLocalidades:
+    """Encuentra la localidad mencionada en un texto aunque venga con tipeos o sin acentos."""
+
+    def __init__(self, distancias=DISTANCIAS_KM, alias=ALIAS_LOCALIDADES):
+        self.nombres = {}  # clave normalizada -> nombre oficial
+        for nombre in distancias: self.nombres[_clave(nombre)] = nombre
+        for a, nombre in alias.items(): self.nombres[_clave(a)] = nombre
+        self.max_palabras = max(len(c.split()) for c in self.nombres)
+        self.por_trigrama = defaultdict(set)
+        for clave in self.nombres:
+            for tg in trigramas(clave.replace(" ", "#")): self.por_trigrama[tg].add(clave)
+
+    def _parecida(self, texto):
+        # Un tipeo (Levenshtein 1; 2 en nombres largos) de una sola localidad. Empates o palabras cortas: nada
+        if len(texto.replace(" ", "")) < 5: return None
+        tope = 1 if len(texto) < 9 else 2
+        candidatas = set()
+        for tg in trigramas(texto.replace(" ", "#")): candidatas |= self.por_trigrama.get(tg, set())
+        distancias = sorted((_distancia(texto, clave, tope), clave) for clave in candidatas)
+        distancias = [d for d in distancias if d[0] <= tope]
+        if not distancias or (len(distancias) > 1 and distancias[1][0] == distancias[0][0]): return None
+        return distancias[0][1]
+
+    def buscar_todas(self, texto, aproximado=True):
+        """[(nombre oficial, palabras usadas del texto)] en el orden en que aparecen, sin repetir."""
+        palabras = _clave(texto).split()
+        encontradas, ocupadas = [], set()
+        # Primero lo exacto y lo más largo ("SAN MARTIN DE LAS ESCOBAS" antes que "SAN MARTIN")
+        for n in range(min(self.max_palabras, len(palabras)), 0, -1):
+            for i in range(len(palabras) - n + 1):
+                rango = set(range(i, i + n))
+                frase = " ".join(palabras[i:i + n])
+                if frase in self.nombres and not rango & ocupadas:
+                    encontradas.append((i, self.nombres[frase], tuple(palabras[i:i + n])))
+                    ocupadas |= rango
+        if aproximado:
+            # Después tipeos ("rafela", "sunchale"), solo en lo que sigue a "a / para / hasta"
+            for i, p in enumerate(palabras):
+                if p not in _PISTAS_LOCALIDAD: continue
+                j = i + 1
+                while j < len(palabras) and palabras[j] in _ARTICULOS: j += 1
+                for n in (3, 2, 1):
+                    rango = set(range(j, j + n))
+                    if j + n > len(palabras) or rango & ocupadas: continue
+                    clave = self._parecida(" ".join(palabras[j:j + n]))
+                    if clave:
+                        encontradas.append((j, self.nombres[clave], tuple(palabras[j:j + n])))
+                        ocupadas |= rango
+                        break
+        salida, vistas = [], set()
+        for _, nombre, usadas in sorted(encontradas):
+            if nombre not in vistas: vistas.add(nombre); salida.append((nombre, usadas))
+        return salida
+
+    def buscar(self, texto, aproximado=True):
+        """(nombre oficial, palabras usadas del texto) de la primera localidad, o (None, ())."""
+        todas = self.buscar_todas(texto, aproximado)
+        return todas[0] if todas else (None, ())
+
+def _distancia(a, b, tope):
+    # Levenshtein que corta apenas se pasa del tope
+    if abs(len(a) - len(b)) > tope: return tope + 1
+    previa = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        actual = [i]
+        for j, cb in enumerate(b, 1):
+            actual.append(min(previa[j] + 1, actual[j - 1] + 1, previa[j - 1] + (ca != cb)))
+        if min(actual) > tope: return tope + 1
+        previa = actual
+    return previa[-1]
+
+indice_localidades = IndiceLocalidades()
+
+# ==========================================
+# CÁLCULO DE FLETE
+# ==========================================
+_GRATIS = {_clave(c) for c in CIUDADES_GRATIS}
+
+class Flete:
+    def __init__(self, localidad, km, costo):
+        self.localidad = localidad
+        self.km = km
+        self.costo = costo
+
+    @property
+    def gratis(self):
+        return self.costo == 0
+
+    def texto(self):
+        if self.gratis: return f"🚚 Envío a {self.localidad}: ¡GRATIS! (zona de reparto)."
+        return f"🚚 Envío a {self.localidad} (~{self.km} km): ${self.costo:,.0f} con IVA."
+
+def costo_km(dolar):
+    return COSTO_FLETE_USD * dolar * (1 + IVA)
+
+def _flete(nombre, dolar):
+    km = DISTANCIAS_KM[nombre]
+    costo = 0 if _clave(nombre) in _GRATIS else round(km * costo_km(dolar), 2)
+    return Flete(nombre, km, costo)
+
+def calcular_flete(localidad, dolar, aproximado=True):
+    """Flete a una localidad (nombre libre). None si no está en la tabla."""
+    nombre, _ = indice_localidades.buscar(localidad, aproximado)
+    return None if nombre is None else _flete(nombre, dolar)
+
+def menciona_flete(texto):
+    # Habla del envío o nombra una localidad (aunque también pida productos)
+    return any(p in PALABRAS_FLETE for p in _clave(texto).split()) or bool(indice_localidades.buscar_todas(texto, False))
+
+def es_pregunta_flete(texto, es_producto=None):
+    """Sí si el mensaje es solo por el envío ("¿cuánto sale el flete a Rafaela?"), sin productos.
+
+    es_producto(token) dice si una palabra sobrante es del catálogo: con cantidades o productos
+    es un pedido con envío y lo arma la IA (con contexto_flete).
+    """
+    palabras = _RE_TOKEN.findall(normalizar(texto))
+    if not any(p in PALABRAS_FLETE for p in palabras): return False
+    localidades = indice_localidades.buscar_todas(texto)
+    if not localidades: return False
+    usadas = {p for _, palabras_localidad in localidades for p in palabras_localidad}
+    resto = [p for p in palabras if p not in PALABRAS_FLETE and p not in _RELLENO_FLETE and p not in usadas]
+    if any(c.isdigit() for p in resto for c in p): return False
+    if es_producto and any(es_producto(p) for p in resto): return False
+    return len(resto) <= 1
+
+def responder_flete(texto, dolar, es_producto=None):
+    # Respuesta directa sin IA (una línea por localidad); None si no es una pregunta de flete
+    if not es_pregunta_flete(texto, es_producto): return None
+    fletes = [_flete(nombre, dolar) for nombre, _ in indice_localidades.buscar_todas(texto)]
+    return "\n".join(f.texto() for f in fletes) + f"\n\n¿Armamos el pedido? Pagás {CONDICION_PAGO}."
+
+def contexto_flete(texto, dolar):
+    # Líneas para la IA con cada localidad que nombra el mensaje (pedido + envío en un mismo mensaje)
+    lineas = []
+    for nombre, _ in indice_localidades.buscar_todas(texto):
+        flete = _flete(nombre, dolar)
+        lineas.append(f"FLETE {flete.localidad}: {flete.km} km -> {'GRATIS' if flete.gratis else f'${flete.costo:,.0f} con IVA'}")
+    return "\n".join(lineas)
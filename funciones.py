@@ -1,57 +1,176 @@
 # funciones.py
 import streamlit as st
-import pandas as pd
-import google.generativeai as genai
 import requests
 import re
 import datetime
+import functools
+import contextlib
+import time
 import urllib.parse
 from bs4 import BeautifulSoup
 import os
+import hmac
 from config import *
+from catalogo import obtener_indice, obtener_tabla_precios, servicio_catalogo, tokenizar
+from cotizador import cotizar
+from precios import Carrito, precio_carrito
+from flete import responder_flete, contexto_flete, menciona_flete
+from ordenes import leer_items, texto_de, obtener_validador, ExtractorMensaje
+from ia import registro_modelos, es_cuota, ColaLlena
+from conversacion import SEPARADOR_DB
+from imagenes import preprocesar_async, huella, cache_imagenes
+from metricas import metricas
+from eventos import registro_eventos
+from almacen import almacen
 
 # ==========================================
 # MOTOR INVISIBLE
 # ==========================================
-@st.cache_data(ttl=3600)
+@st.cache_data(ttl=TTL_DOLAR)
 def obtener_dolar_bna():
-    try:
-        r = requests.get("https://dolarapi.com/v1/dolares/oficial", timeout=3)
-        if r.status_code == 200:
-            data = r.json()
-            return float(data['venta'])
-    except: pass
+    # Primero el valor que ya trajo alguna réplica; la API solo si nadie lo tiene al día
+    compartido = almacen().obtener("dolar")
+    if compartido is not None:
+        metricas().contar("dolar", resultado="compartido")
+        return float(compartido)
+    with metricas().medir("etapa_segundos", etapa="dolar"):
+        try:
+            r = requests.get("https://dolarapi.com/v1/dolares/oficial", timeout=3)
+            if r.status_code == 200:
+                data = r.json()
+                metricas().contar("dolar", resultado="api")
+                almacen().guardar("dolar", float(data['venta']), TTL_DOLAR)
+                return float(data['venta'])
+        except: pass
+    metricas().contar("dolar", resultado="respaldo")
     return 1060.00 # Backup fijo
 
-@st.cache_data(ttl=600)
 def load_data():
-    try: 
-        # Carga robusta del CSV
-        df = pd.read_csv(SHEET_URL, dtype=str).fillna("")
-        return df.to_csv(index=False)
-    except Exception as e: 
-        return ""
+    # Última versión buena del catálogo; se revalida sola en segundo plano
+    return servicio_catalogo().obtener()
+
+def indice_catalogo():
+    servicio = servicio_catalogo()
+    servicio.obtener()
+    csv_context, version = servicio.estado
+    if not csv_context: return None
+    return obtener_indice(version, csv_context)
+
+def precios_catalogo(indice=None):
+    # Catálogo con precios finales en pesos para el dólar actual (se calcula una vez por versión/dólar)
+    indice = indice or indice_catalogo()
+    if indice is None: return None
+    return obtener_tabla_precios(servicio_catalogo().version, obtener_dolar_bna(), indice.df)
+
+def contexto_catalogo(texto):
+    # Solo las filas del catálogo relevantes para este mensaje (no la planilla entera)
+    indice = indice_catalogo()
+    if indice is None: return ""
+    return indice.contexto(texto, tabla=precios_catalogo(indice))
+
+def cotizar_local(texto):
+    # Pedidos simples (producto + medida + cantidad) se cotizan sin llamar a la IA
+    indice = indice_catalogo()
+    if indice is None: return None
+    try:
+        cot = cotizar(texto, indice, precios_catalogo(indice))
+    except Exception:
+        return None
+    if cot is None or cot.confianza < UMBRAL_COTIZADOR: return None
+    return cot.texto
+
+def respuesta_local(texto):
+    # Lo que se contesta sin IA: preguntas de flete y pedidos simples
+    with metricas().medir("etapa_segundos", etapa="local"):
+        indice = indice_catalogo()
+        es_producto = (lambda p: bool(indice.filas_con(p))) if indice is not None else None
+        try: res = responder_flete(texto, obtener_dolar_bna(), es_producto)
+        except Exception: res = None
+        tipo = "flete"
+        # Pedido + envío en el mismo mensaje: lo arma la IA con contexto_flete (acá se perdería una de las dos)
+        if not res and not menciona_flete(texto): res, tipo = cotizar_local(texto), "cotizador"
+    metricas().contar("respuesta_local", resultado="hit" if res else "miss", **({"tipo": tipo} if res else {}))
+    return res
+
+def resumen_carrito():
+    # Estado del carrito para el resumen que acompaña cada turno a la IA
+    if not st.session_state.get("cart"): return ""
+    lineas = [f"{i['cantidad']:g}x {i['producto']} (${i['precio_unit']:,.0f})" for i in st.session_state.cart]
+    return "\n".join(lineas) + f"\nSUBTOTAL: ${st.session_state.cart.subtotal:,.0f}"
+
+def registrar_evento(tipo, **datos):
+    # Se encola y listo: lo escribe a disco un hilo aparte
+    registro_eventos().registrar(tipo, st.session_state.get("sesion_id"), **datos)
 
 def log_interaction(user_text, monto):
     ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     st.session_state.log_data.append({"Fecha": ts, "Usuario": user_text[:50], "Monto": monto})
+    registrar_evento("interaccion", texto=user_text[:500], monto=monto)
+
+def buscar_en_catalogo(texto, tipo=None):
+    # Buscador de la pestaña CATÁLOGO: filas con precio en pesos listo, sin pasar por la IA
+    indice = indice_catalogo()
+    if indice is None: return indice, None
+    filas = indice.sugerir(texto, tipo)
+    return indice, precios_catalogo(indice).iloc[filas]
+
+def agregar_del_catalogo(indice, fila, cantidad):
+    # Alta directa desde el buscador (mismo formato de ítem que las órdenes [ADD:...] del bot)
+    if not cantidad or cantidad <= 0 or fila["PRECIO_ARS"] != fila["PRECIO_ARS"]: return None
+    nombre = str(fila[indice.col_nombre]).strip()
+    tipo = str(fila[indice.col_tipo]).strip().upper() if indice.col_tipo else ""
+    item = {
+        "cantidad": float(cantidad),
+        "producto": nombre,
+        "precio_unit": float(fila["PRECIO_ARS"]),
+        "subtotal": float(cantidad) * float(fila["PRECIO_ARS"]),
+        "tipo": tipo or (tokenizar(nombre) or [""])[0],
+    }
+    st.session_state.cart.append(item)
+    st.session_state.cart_rev += 1
+    registrar_evento("carrito", accion="agregar", origen="catalogo", items=[item])
+    return item
+
+def validador_pedidos():
+    indice = indice_catalogo()
+    if indice is None: return None
+    validador = obtener_validador(servicio_catalogo().version, obtener_dolar_bna(), indice, precios_catalogo(indice))
+    # Planilla sin nombres o sin precios legibles: se cargan los ítems sin validar antes que rechazar todo
+    return validador if validador.activo else None
 
 def parsear_ordenes_bot(texto):
+    """(ítems agregados, aviso para el cliente con lo que no se pudo agregar o "")."""
+    with metricas().medir("etapa_segundos", etapa="pedido"):
+        items_nuevos, rechazados = _parsear_ordenes(texto)
+    if items_nuevos:
+        metricas().contar("pedido_items", len(items_nuevos), resultado="ok")
+        registrar_evento("carrito", accion="agregar", origen="chat", items=items_nuevos)
+    if rechazados: metricas().contar("pedido_items", len(rechazados), resultado="rechazado")
+    return items_nuevos, aviso_rechazados(rechazados)
+
+def aviso_rechazados(rechazados):
+    if not rechazados: return ""
+    lineas = [f"- {r['item']} ({'no entendí cantidad o precio' if r['motivo'].startswith('mal formado') else r['motivo']})"
+              for r in rechazados[:5]]
+    if len(rechazados) > 5: lineas.append(f"- y {len(rechazados) - 5} más")
+    return "⚠️ Esto no lo pude sumar al carrito:\n" + "\n".join(lineas) + "\nDecime cómo figura en la lista y lo agrego."
+
+def _parsear_ordenes(texto):
+    # Ítems del modelo (JSON o [ADD:...]) validados contra el catálogo; lo que no pasa queda registrado
+    items, rechazados = leer_items(texto)
+    validador = validador_pedidos()
     items_nuevos = []
-    # Regex para detectar órdenes del bot: [ADD:CANT:PROD:PRECIO:TIPO]
-    for cant, prod, precio, tipo in re.findall(r'\[ADD:([\d\.]+):([^:]+):([\d\.]+):([^\]]+)\]', texto):
-        try:
-            item = {
-                "cantidad": float(cant), 
-                "producto": prod.strip(), 
-                "precio_unit": float(precio), 
-                "subtotal": float(cant)*float(precio), 
-                "tipo": tipo.strip().upper()
-            }
-            st.session_state.cart.append(item)
-            items_nuevos.append(item)
-        except: pass 
-    return items_nuevos
+    for item in items:
+        if validador is not None:
+            valido, motivo = validador.validar(item)
+            if valido is None:
+                rechazados.append({"item": item["producto"], "motivo": motivo})
+                continue
+            item = valido
+        st.session_state.cart.append(item)
+        items_nuevos.append(item)
+    if rechazados: st.session_state.pedidos_rechazados.extend(rechazados)
+    return items_nuevos, rechazados
 
 def calcular_negocio():
     try:
@@ -70,58 +189,95 @@ def calcular_negocio():
             reloj_init = "00:00"
             color_reloj = "#b0bec5"
 
-        bruto = sum(i['subtotal'] for i in st.session_state.cart)
-        desc_base = 0; desc_extra = 0; nivel_texto = "LISTA"; color = "#546e7a"; meta = META_BASE
-        
-        tipos = [x['tipo'] for x in st.session_state.cart]
-        tiene_chapa = any("CHAPA" in t for t in tipos)
-        tiene_perfil = any("PERFIL" in t for t in tipos)
-        tiene_acero = any(t in ["HIERRO", "MALLA", "CLAVOS", "ALAMBRE", "PERFIL", "CHAPA", "TUBO", "CAÑO"] for t in tipos)
-        tiene_pintura = any("PINTURA" in t or "ACCESORIO" in t or "ELECTRODO" in t for t in tipos)
-
-        if activa:
-            if bruto > META_MAXIMA: desc_base = 15; nivel_texto = "PARTNER MAX"; color = "#6200ea"; meta = 0
-            elif bruto > META_MEDIA: desc_base = 12; nivel_texto = "CONSTRUCTOR"; color = "#d32f2f"; meta = META_MAXIMA
-            elif bruto > META_BASE: desc_base = 10; nivel_texto = "OBRA"; color = "#f57c00"; meta = META_MEDIA
-            else: desc_base = 3; nivel_texto = "CONTADO"; color = "#2e7d32"; meta = META_BASE
-
-            boosters = []
-            if tiene_chapa and tiene_perfil: desc_extra += 3; boosters.append("KIT TECHO")
-            elif tiene_acero and tiene_pintura: desc_extra += 2; boosters.append("PACK TERM.")
-                
-            desc_total = min(desc_base + desc_extra, 18)
-            if desc_extra > 0: 
-                nivel_texto = f"{nivel_texto} + {' '.join(boosters)}"
-                if desc_total >= 15: color = "#6200ea" 
-        else:
-            desc_total = 0; nivel_texto = "EXPIRADO"; color = "#455a64"
-
-        neto = bruto * (1 - (desc_total/100))
-        ahorro_total = bruto - neto
-        return bruto, neto, desc_total, color, nivel_texto, meta, segundos_restantes, activa, color_reloj, reloj_init, ahorro_total
+        # Totales al día en el carrito + tabla de reglas (config.py): no se recorre el carrito
+        precio = precio_carrito(st.session_state.cart, activa)
+        return precio.bruto, precio.neto, precio.descuento, precio.color, precio.nivel, precio.meta, segundos_restantes, activa, color_reloj, reloj_init, precio.ahorro
     except:
         return 0, 0, 0, "#000", "ERROR", 0, 0, False, "#000", "00:00", 0
 
+def textos_header(subtotal, total_final, nombre_nivel, prox_meta, dinero_ahorrado):
+    porcentaje_barra = 100
+    if prox_meta > 0: porcentaje_barra = min((subtotal / prox_meta) * 100, 100)
+
+    display_precio = f"${total_final:,.0f}" if subtotal > 0 else "COTIZAR"
+    display_iva = "+IVA" if subtotal > 0 else ""
+    display_badge = nombre_nivel[:25] + "..." if len(nombre_nivel) > 25 and subtotal > 0 else (nombre_nivel if subtotal > 0 else "⚡ 3% OFF")
+    subtext_badge = f"🔥 AHORRAS: ${dinero_ahorrado:,.0f}" if dinero_ahorrado > 0 else "TIEMPO LIMITADO"
+    return porcentaje_barra, display_precio, display_iva, display_badge, subtext_badge
+
+def aplicar_cambios_carrito(cantidades):
+    # Aplica en un solo paso las cantidades editadas {índice: cantidad}; 0 o ausente = se quita
+    cart = st.session_state.cart
+    # De atrás para adelante: quitar un ítem no corre los índices que faltan
+    for i in reversed(range(len(cart))):
+        cant = cantidades.get(i, 0)
+        if cant != cart[i]['cantidad']: cart.actualizar(i, cant)
+
+def aplicar_editor_carrito(key):
+    # Callback del formulario del carrito: lee los cambios del data_editor antes de redibujar
+    cambios = st.session_state.get(key) or {}
+    cantidades = {i: item['cantidad'] for i, item in enumerate(st.session_state.cart)}
+    for i, cols in cambios.get("edited_rows", {}).items():
+        if cols.get("Cant") is not None: cantidades[int(i)] = float(cols["Cant"])
+    for i in cambios.get("deleted_rows", []): cantidades[int(i)] = 0
+    aplicar_cambios_carrito(cantidades)
+    st.session_state.cart_rev += 1
+    registrar_evento("carrito", accion="editar", items=len(st.session_state.cart), subtotal=st.session_state.cart.subtotal)
+    guardar_carrito()  # callback de fragmento: no llega al final del script
+
+def vaciar_carrito():
+    registrar_evento("carrito", accion="vaciar", items=len(st.session_state.cart), subtotal=st.session_state.cart.subtotal)
+    st.session_state.cart.vaciar()
+    st.session_state.cart_rev += 1
+    guardar_carrito()
+
+def recuperar_carrito(sesion_id):
+    # Carrito guardado de esta sesión (recarga de página, reinicio o pedido atendido por otra réplica)
+    return Carrito(almacen().obtener("carrito:" + sesion_id) or [])
+
+def guardar_carrito():
+    # Al final de cada rerun y en los callbacks del carrito; solo si cambió desde la última vez
+    cart = st.session_state.cart
+    if cart.revision == st.session_state.get("cart_guardado"): return
+    if almacen().guardar("carrito:" + st.session_state.sesion_id, list(cart), TTL_CARRITO):
+        st.session_state.cart_guardado = cart.revision
+
 def generar_link_wa(total):
     try:
         txt = "HOLA, QUIERO CONGELAR PRECIO YA (Oferta Flash):\n" + "\n".join([f"▪ {i['cantidad']}x {i['producto']}" for i in st.session_state.cart])
         txt += f"\n💰 TOTAL FINAL: ${total:,.0f} + IVA"
-        return f"https://wa.me/5493401527780?text={urllib.parse.quote(txt)}"
+        link = f"https://wa.me/5493401527780?text={urllib.parse.quote(txt)}"
+        # El clic pasa en el navegador (no se ve desde acá): se registra cada link distinto que se le ofrece,
+        # no como compra. Cambia con cada edición del carrito, así que no sirve para contar checkouts.
+        if st.session_state.cart and st.session_state.get("ultimo_checkout") != link:
+            st.session_state.ultimo_checkout = link
+            registrar_evento("checkout_ofrecido", total=total, items=[(i['cantidad'], i['producto']) for i in st.session_state.cart])
+        return link
     except:
         return "https://wa.me/5493401527780"
 
 # ==========================================
 # IA LOGIC (CEREBRO)
 # ==========================================
+PROTOCOLO_JSON = """Responde SOLO con JSON: {"mensaje": "...", "pedido": [{"cantidad": 0, "producto": "...", "precio_unit": 0, "tipo": "..."}]}
+    - mensaje: lo que lee el cliente, conversacional y breve (máximo 4 líneas). No repitas ahí el detalle del pedido en otro formato.
+    - pedido: solo si hay pedido concreto (si no, lista vacía). producto = nombre EXACTO de la DB, precio_unit = PRECIO_ARS, tipo = TIPO de la DB."""
+PROTOCOLO_TAGS = """Tu respuesta conversacional y breve al usuario.
+    Si hay pedido concreto agrega al final: [ADD:CANTIDAD:PRODUCTO:PRECIO_ARS:TIPO]"""
+
+@functools.lru_cache(maxsize=4)
 def get_sys_prompt(csv_context, DOLAR_BNA):
+    columnas = csv_context.split("\n", 1)[0] + ",PRECIO_ARS,PRECIO_ARS_IVA"
+    flete_km = COSTO_FLETE_USD * DOLAR_BNA * (1 + IVA)
     return f"""
     ROL: Miguel, vendedor experto de Pedro Bravin S.A.
-    DB: {csv_context}
+    DB: En cada mensaje te paso las filas relevantes de la planilla (columnas: {columnas}).
+    PRECIOS: PRECIO_ARS es el precio unitario en pesos SIN IVA y PRECIO_ARS_IVA con IVA. Ya están convertidos: NO hagas cuentas con el dólar.
     ZONA GRATIS (PUNTOS LOGÍSTICOS): {CIUDADES_GRATIS}
     DOLAR BNA VENTA: {DOLAR_BNA}
 
     🛑 **REGLA DE ORO:**
-    1. TU ÚNICA FUENTE DE VERDAD ES LA "DB".
+    1. TU ÚNICA FUENTE DE VERDAD ES LA "DB" (las filas que vienen con cada mensaje).
     2. Si un producto NO está en la DB, di: "No tengo stock de eso" o sugiere un sustituto.
     3. JAMÁS INVENTES UN PRECIO.
 
@@ -132,41 +288,225 @@ def get_sys_prompt(csv_context, DOLAR_BNA):
 
     🚚 **FLETE:**
     1. ZONA GRATIS: {CIUDADES_GRATIS} -> ENVÍO $0.
-    2. FUERA DE ZONA: `KM * 0.85 USD * {DOLAR_BNA} * 1.21`.
+    2. FUERA DE ZONA: si el mensaje trae una línea FLETE, usa ese monto tal cual.
+       Si no, pide la localidad; solo con KM que diga el cliente: KM x ${flete_km:,.2f} (por km, IVA incluido).
     
     PROTOCOLO SALIDA:
-    Tu respuesta conversacional y breve al usuario.
-    Si hay pedido concreto agrega al final: [ADD:CANTIDAD:PRODUCTO:PRECIO_UNITARIO_FINAL_PESOS:TIPO]
+    {PROTOCOLO_JSON if SALIDA_ESTRUCTURADA else PROTOCOLO_TAGS}
     """
 
+def armar_prompt(contenido, es_imagen=False):
+    if es_imagen: return _armar_prompt(contenido, es_imagen)
+    with metricas().medir("etapa_segundos", etapa="prompt"):
+        return _armar_prompt(contenido, es_imagen)
+
+def _armar_prompt(contenido, es_imagen=False):
+    msg = contenido
+    if es_imagen:
+        # 1° paso: la IA solo lee la foto; con ese texto se buscan las filas de la DB
+        # Texto libre: con el esquema de respuesta el modelo lo metería en "mensaje"/"pedido"
+        msg = texto_de(st.session_state.chat_session.send_message(
+            ["DETECTA PRODUCTOS Y CANTIDADES DE ESTA IMAGEN. UNO POR LÍNEA, SIN PRECIOS.", contenido],
+            estructurada=False,
+        ).text)
+        msg = f"COTIZA ESTO:\n{msg}"
+    db = contexto_catalogo(msg)
+    # Las filas van al final, después del separador: en turnos viejos se recortan
+    db = f"DB (filas relevantes):\n{db}" if db else "DB: (sin coincidencias)"
+    flete = contexto_flete(msg, obtener_dolar_bna())
+    if flete: db += f"\n{flete}"
+    return f"{msg}. (Responde breve. Usa precios DB).{SEPARADOR_DB}{db}"
+
+def respuesta_respaldo(prompt, e):
+    # El planificador ya probó el respaldo (Gemini 1.5 Flash) antes de llegar acá:
+    # un 429, la cola llena o el tiempo agotado significa que no hay cupo en ningún modelo
+    if es_cuota(e) or isinstance(e, (ColaLlena, TimeoutError)):
+        metricas().contar("respaldo", motivo="saturado")
+        return "⚠️ SERVIDORES SATURADOS: Intenta en 1 minuto."
+    metricas().contar("respaldo", motivo="error")
+    
+    # Si es otro error, lo mostramos
+    return f"⚠️ ERROR TÉCNICO: {str(e)}"
+
 def procesar_input(contenido, es_imagen=False):
     if "chat_session" in st.session_state:
-        msg = contenido
-        prefix = ""
-        if es_imagen: msg = ["COTIZA ESTO. DETECTA PRODUCTOS Y CANTIDADES.", contenido]
-        prompt = f"{prefix}{msg}. (Responde breve. Usa precios DB)." if not es_imagen else msg
+        try:
+            prompt = armar_prompt(contenido, es_imagen)
+        except Exception as e:
+            return f"⚠️ ERROR TÉCNICO: {str(e)}"
         
         # --- BLOQUE ANTI-FALLOS 429 ---
         try:
             # 1. Intento Principal con el modelo activo (2.5 o 2.0)
             return st.session_state.chat_session.send_message(prompt).text
         except Exception as e:
-            error_msg = str(e).lower()
-            # 2. Si detectamos bloqueo por cuota (429) o sobrecarga
-            if "429" in error_msg or "quota" in error_msg:
-                try:
-                    # 🚀 ACTIVAMOS EL MOTOR DE RESPALDO (Gemini 1.5 Flash) SOLO POR ESTA VEZ
-                    # Esto evita que el usuario vea el error.
-                    datos = load_data()
-                    dolar = obtener_dolar_bna()
-                    sys = get_sys_prompt(datos, dolar)
-                    
-                    backup_model = genai.GenerativeModel("gemini-1.5-flash", system_instruction=sys)
-                    return backup_model.generate_content(prompt).text
-                except Exception as e2:
-                    return f"⚠️ SERVIDORES SATURADOS: Intenta en 1 minuto."
-            
-            # Si es otro error, lo mostramos
-            return f"⚠️ ERROR TÉCNICO: {str(e)}"
+            return respuesta_respaldo(prompt, e)
             
     return "Error: Chat off (Reinicia la página)."
+
+def procesar_imagen(datos):
+    # El achique/rotado corre en otro hilo mientras se busca la misma foto en el cache (sha256 del archivo):
+    # si ya se cotizó, la respuesta sale sin esperar la foto preparada
+    preparada = preprocesar_async(datos)
+    sha = huella(datos)
+    contexto = (servicio_catalogo().version, obtener_dolar_bna())
+    txt = cache_imagenes.buscar(sha, contexto)
+    metricas().contar("cache_imagenes", resultado="miss" if txt is None else "hit")
+    if txt is not None:
+        preparada.cancel()
+        return txt
+    txt = procesar_input(preparada.result().blob, True)
+    if not es_error(txt): cache_imagenes.guardar(sha, contexto, txt)
+    return txt
+
+def obtener_api_key():
+    try:
+        if "GOOGLE_API_KEY" in st.secrets: return st.secrets["GOOGLE_API_KEY"]
+    except: pass
+    return os.environ.get("GOOGLE_API_KEY")
+
+def obtener_admin_token():
+    try:
+        if "ADMIN_TOKEN" in st.secrets: return st.secrets["ADMIN_TOKEN"]
+    except: pass
+    return os.environ.get("ADMIN_TOKEN")
+
+def es_admin(clave):
+    # Sin ADMIN_TOKEN configurado no hay vista de admin para nadie
+    token = obtener_admin_token()
+    return bool(token and clave) and hmac.compare_digest(clave.encode(), str(token).encode())
+
+def preparar_ia(api_key=None):
+    # Una vez por proceso (y por versión de catálogo/dólar): prueba modelos y arma el prompt
+    registro = registro_modelos()
+    if api_key: registro.configurar(api_key)
+    registro.probar()
+    csv_context, version = servicio_catalogo().estado
+    dolar = obtener_dolar_bna()
+    registro.preparar((version, dolar), lambda: get_sys_prompt(csv_context, dolar))
+    return registro
+
+# ==========================================
+# STREAMING (RESPUESTA POR PARTES)
+# ==========================================
+_RE_TAG_ADD = re.compile(r'\[ADD:.*?\]')
+MARCAS_INTERNAS = ("[TEXTO VISIBLE]", "SALIDA:")
+
+def limpiar_visible(texto):
+    texto = _RE_TAG_ADD.sub('', texto_de(texto))
+    for marca in MARCAS_INTERNAS: texto = texto.replace(marca, "")
+    return texto
+
+def agregar_mensaje(role, content):
+    # El texto a mostrar se limpia una sola vez, al guardar el mensaje (no en cada rerun)
+    st.session_state.messages.append({"role": role, "content": content, "display": limpiar_visible(content).strip()})
+
+class FiltroVisible:
+    """Limpia tags [ADD:...] y marcas internas de un texto que llega en pedazos.
+
+    Si la respuesta es JSON solo deja pasar el campo "mensaje".
+    """
+
+    def __init__(self):
+        self.pendiente = ""
+        self.json = None  # ExtractorMensaje si la respuesta empezó con "{" o ```; False si es texto
+
+    def feed(self, chunk):
+        if self.json is None:
+            inicio = (self.pendiente + chunk).lstrip()
+            if not inicio:
+                self.pendiente += chunk
+                return ""
+            self.json = ExtractorMensaje() if inicio[0] in "{`" else False
+            if self.json: chunk, self.pendiente = self.pendiente + chunk, ""
+        if self.json: return self.json.feed(chunk)
+        self.pendiente += chunk
+        corte = len(self.pendiente)
+        # Un "[" sin cerrar puede ser el comienzo de un tag: se retiene hasta ver el "]"
+        abre = self.pendiente.rfind("[")
+        if abre > self.pendiente.rfind("]") and len(self.pendiente) - abre < 200: corte = abre
+        # Lo mismo con el comienzo de una marca partida entre chunks ("SAL" + "IDA:")
+        for marca in MARCAS_INTERNAS:
+            for n in range(len(marca) - 1, 0, -1):
+                if self.pendiente[:corte].endswith(marca[:n]):
+                    corte = min(corte, len(self.pendiente[:corte]) - n)
+                    break
+        visible, self.pendiente = self.pendiente[:corte], self.pendiente[corte:]
+        return limpiar_visible(visible)
+
+    def cerrar(self):
+        # Empezaba como JSON pero nunca apareció "mensaje" (modelo sin salida JSON que arrancó con ` o {): va el texto
+        if self.json: return "" if self.json.pos is not None else limpiar_visible(self.json.buffer)
+        visible, self.pendiente = self.pendiente, ""
+        return limpiar_visible(visible)
+
+class RespuestaStream:
+    """Iterable para st.write_stream. Al terminar deja el texto crudo y los tiempos del turno."""
+
+    def __init__(self, chat, contenido):
+        self.chat = chat
+        self.contenido = contenido
+        self.texto = ""
+        self.ttft = None
+        self.total = None
+        self.cortada = False
+
+    def __iter__(self):
+        t0 = time.perf_counter()
+        filtro = FiltroVisible()
+        if self.chat is None:
+            self.texto = "Error: Chat off (Reinicia la página)."
+            return
+        try:
+            prompt = armar_prompt(self.contenido)
+        except Exception as e:
+            self.texto = f"⚠️ ERROR TÉCNICO: {str(e)}"
+            return
+        try:
+            for chunk in self.chat.send_message(prompt, stream=True):
+                if self.ttft is None: self.ttft = time.perf_counter() - t0
+                self.texto += chunk.text
+                visible = filtro.feed(chunk.text)
+                if visible: yield visible
+        except Exception as e:
+            if not self.texto:
+                # Sin nada mostrado todavía: mismo respaldo que el modo normal
+                self.texto = respuesta_respaldo(prompt, e)
+                if self.ttft is None: self.ttft = time.perf_counter() - t0
+                if not es_error(self.texto): yield filtro.feed(self.texto)
+            else:
+                # Cortada a la mitad: el pedazo (JSON incompleto) no se guarda ni se lee como pedido
+                metricas().contar("respuesta_cortada", motivo=type(e).__name__)
+                self.cortada = True
+                self.texto = AVISO_CORTE
+                yield f"\n\n{AVISO_CORTE}"
+                self.total = time.perf_counter() - t0
+                return
+        resto = filtro.cerrar()
+        if resto: yield resto
+        self.total = time.perf_counter() - t0
+
+@contextlib.contextmanager
+def aviso_cola():
+    # Posición en la cola compartida mientras se espera turno para la IA. El callback vive solo
+    # este turno: después el placeholder ya no existe y no hay que escribirle.
+    aviso = st.empty()
+    chat = st.session_state.get("chat_session")
+    if chat is not None: chat.avisar = lambda pos: aviso.caption(f"⏳ Mucha demanda: estás N° {pos + 1} en la fila...")
+    try:
+        yield aviso
+    finally:
+        if chat is not None: chat.avisar = None
+
+def procesar_input_stream(contenido):
+    return RespuestaStream(st.session_state.get("chat_session"), contenido)
+
+def es_error(texto):
+    return texto.startswith(("⚠️ ERROR TÉCNICO", "⚠️ SERVIDORES", "Error: Chat off"))
+
+def registrar_latencia(ttft, total, modo="stream"):
+    ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    st.session_state.latencias.append({"Fecha": ts, "Modo": modo, "TTFT (s)": ttft, "Total (s)": total})
+    if ttft is not None: metricas().observar("ttft_segundos", ttft, modo=modo)
+    if total is not None: metricas().observar("turno_segundos", total, modo=modo)
+    registrar_evento("turno", modo=modo, ttft=ttft, total=total)
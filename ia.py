@@ -0,0 +1,421 @@
+# ia.py
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import google.generativeai as genai
+from google.api_core.exceptions import InvalidArgument
+from config import *
+from conversacion import GestorConversacion, tokens_mensaje, estimar_tokens
+from metricas import metricas
+from ordenes import ESQUEMA_RESPUESTA
+
+# ==========================================
+# LIMITADOR GLOBAL + CIRCUITO POR MODELO
+# ==========================================
+class ColaLlena(Exception):
+    pass
+
+def es_cuota(e):
+    msg = str(e).lower()
+    return "429" in msg or "quota" in msg or "resource_exhausted" in msg or "resource exhausted" in msg
+
+class TokenBucket:
+    """Reparte el cupo de pedidos por minuto entre todas las sesiones del proceso."""
+
+    def __init__(self, por_minuto=RPM_IA, rafaga=RAFAGA_IA):
+        self.tasa = por_minuto / 60.0
+        self.capacidad = float(rafaga)
+        self.tokens = float(rafaga)
+        self.ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _recargar(self):
+        ahora = time.monotonic()
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultimo) * self.tasa)
+        self.ultimo = ahora
+
+    def tomar(self):
+        while True:
+            with self._lock:
+                self._recargar()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                espera = (1 - self.tokens) / self.tasa
+            time.sleep(espera)
+
+    def espera(self):
+        # Segundos hasta que haya un token (0 si ya hay)
+        with self._lock:
+            self._recargar()
+            return max(0.0, (1 - self.tokens) / self.tasa)
+
+    def intentar(self):
+        # Sin esperar: para pedidos opcionales (hedge) que no valen la pena si no hay cupo
+        with self._lock:
+            self._recargar()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+class Circuito:
+    """Tras varios 429 seguidos el modelo queda "abierto" un rato y se va directo al siguiente."""
+
+    def __init__(self, umbral=CIRCUITO_FALLOS, enfriamiento=CIRCUITO_ENFRIAMIENTO):
+        self.umbral = umbral
+        self.enfriamiento = enfriamiento
+        self.fallos = 0
+        self.abierto_hasta = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self):
+        if self.fallos < self.umbral: return "cerrado"
+        return "abierto" if time.monotonic() < self.abierto_hasta else "semiabierto"
+
+    def permite(self):
+        # Semiabierto: pasa un pedido de prueba; si vuelve a fallar se reabre
+        return self.estado != "abierto"
+
+    def exito(self):
+        with self._lock: self.fallos = 0
+
+    def fallo(self):
+        with self._lock:
+            self.fallos += 1
+            if self.fallos >= self.umbral: self.abierto_hasta = time.monotonic() + self.enfriamiento
+
+class Turno:
+    """Lugar ocupado en el planificador: se libera cuando terminan ejecutar() y todas sus llamadas.
+
+    Una llamada colgada sigue ocupando su lugar aunque la sesión ya haya recibido el timeout
+    (cancel() no frena un futuro que ya corre): así no hay más llamadas en vuelo que max_concurrentes.
+    """
+
+    def __init__(self, liberar):
+        self.referencias = 1
+        self.liberar = liberar
+        self._lock = threading.Lock()
+
+    def tomar(self):
+        with self._lock: self.referencias += 1
+
+    def soltar(self, *_):
+        with self._lock:
+            self.referencias -= 1
+            fin = self.referencias == 0
+        if fin: self.liberar()
+
+_FIN = object()
+
+class Planificador:
+    """Cola acotada (FIFO) delante de todas las llamadas a la IA del proceso."""
+
+    def __init__(self, max_concurrentes=MAX_CONCURRENTES_IA, max_cola=MAX_COLA_IA, espera_max=ESPERA_MAX_COLA):
+        self.max_concurrentes = max_concurrentes
+        self.max_cola = max_cola
+        self.espera_max = espera_max
+        self.bucket = TokenBucket()
+        self.circuitos = {}
+        self.latencias = {}
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrentes * 2, thread_name_prefix="ia")
+        self._cola = deque()
+        self._en_curso = 0
+        self._cond = threading.Condition()
+
+    def circuito(self, nombre):
+        with self._cond:
+            if nombre not in self.circuitos: self.circuitos[nombre] = Circuito()
+            return self.circuitos[nombre]
+
+    def _entrar(self, avisar=None):
+        ticket = object()
+        limite = time.monotonic() + self.espera_max
+        with self._cond:
+            if len(self._cola) >= self.max_cola:
+                metricas().contar("ia_rechazos", motivo="cola_llena")
+                raise ColaLlena("cola llena")
+            self._cola.append(ticket)
+        t0 = time.monotonic()
+        try:
+            while True:
+                with self._cond:
+                    if self._cola[0] is ticket and self._en_curso < self.max_concurrentes:
+                        self._cola.popleft()
+                        self._en_curso += 1
+                        metricas().observar("cola_segundos", time.monotonic() - t0)
+                        return
+                    posicion = self._cola.index(ticket)
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        metricas().contar("ia_rechazos", motivo="espera_cola")
+                        raise ColaLlena("tiempo de espera agotado")
+                # El aviso se hace fuera del lock (escribe en la UI de la sesión)
+                if avisar: avisar(posicion)
+                with self._cond: self._cond.wait(min(restante, 0.5))
+        except BaseException:
+            with self._cond:
+                if ticket in self._cola: self._cola.remove(ticket)
+                self._cond.notify_all()
+            raise
+
+    def _salir(self):
+        with self._cond:
+            self._en_curso -= 1
+            self._cond.notify_all()
+
+    def plazo(self, nombre):
+        """Cuánto se espera al modelo antes de lanzar el pedido de cobertura (percentil de su latencia)."""
+        muestras = sorted(self.latencias.get(nombre, ()))
+        if len(muestras) < 20: return HEDGE_INICIAL
+        p = muestras[min(int(len(muestras) * HEDGE_PERCENTIL), len(muestras) - 1)]
+        return min(max(p, HEDGE_MIN), HEDGE_MAX)
+
+    def _registrar(self, nombre, t0, fut):
+        if fut.cancelled(): return
+        e = fut.exception()
+        if e is None:
+            self.circuito(nombre).exito()
+            self.latencias.setdefault(nombre, deque(maxlen=200)).append(time.monotonic() - t0)
+            metricas().observar("ia_segundos", time.monotonic() - t0, modelo=nombre)
+        elif es_cuota(e):
+            self.circuito(nombre).fallo()
+            metricas().contar("ia_errores", modelo=nombre, tipo="429")
+        else:
+            metricas().contar("ia_errores", modelo=nombre, tipo=type(e).__name__)
+
+    def ejecutar(self, llamada, modelos, avisar=None):
+        """llamada(modelo) con el primer modelo con circuito cerrado.
+
+        Ante 429 pasa al siguiente al instante; si el modelo tarda más que su plazo se lanza
+        el mismo pedido al siguiente y gana el primero que responde (el otro se cancela o se descarta).
+        """
+        self._entrar(avisar)
+        turno = Turno(self._salir)
+        try:
+            return self._carrera(llamada, modelos, turno)
+        finally:
+            turno.soltar()
+
+    def leer(self, stream, plazo=TIMEOUT_CHUNK_IA):
+        """Itera un stream de la IA cortando con TimeoutError si un pedazo tarda más que `plazo`.
+
+        Cada stream tiene su propio hilo lector: si se cuelga se lo abandona, sin ocupar nada compartido.
+        """
+        cola = queue.Queue()
+
+        def leer_todo():
+            try:
+                for chunk in stream: cola.put((chunk, None))
+                cola.put((_FIN, None))
+            except BaseException as e:
+                cola.put((None, e))
+
+        threading.Thread(target=leer_todo, name="ia-stream", daemon=True).start()
+        while True:
+            try:
+                chunk, error = cola.get(timeout=plazo)
+            except queue.Empty:
+                metricas().contar("ia_rechazos", motivo="timeout_chunk")
+                raise TimeoutError("la IA dejó de responder a mitad de la respuesta")
+            if error is not None: raise error
+            if chunk is _FIN: return
+            yield chunk
+
+    def _carrera(self, llamada, modelos, turno):
+        candidatos = [(n, m) for n, m in modelos if self.circuito(n).permite()]
+        if len(candidatos) < len(modelos): metricas().contar("ia_circuito_abierto", len(modelos) - len(candidatos))
+        if not candidatos:
+            metricas().contar("ia_rechazos", motivo="todos_en_pausa")
+            raise ColaLlena("429: todos los modelos en pausa")
+        limite = time.monotonic() + TIMEOUT_IA
+        en_vuelo = {}
+        proximo = {"cobertura": 0.0}  # cuándo toca el próximo pedido de cobertura
+        error = None
+
+        def lanzar(cobertura=False):
+            nombre, modelo = candidatos[0]
+            if cobertura:
+                if not self.bucket.intentar():
+                    # Sin cupo: se vuelve a probar cuando se recargue un token (no con wait(0) en loop)
+                    proximo["cobertura"] = time.monotonic() + max(self.bucket.espera(), HEDGE_MIN / 10)
+                    return
+            else:
+                self.bucket.tomar()
+            candidatos.pop(0)
+            metricas().contar("ia_llamadas", modelo=nombre, cobertura=cobertura)
+            t0 = time.monotonic()
+            turno.tomar()
+            fut = self._pool.submit(llamada, modelo)
+            fut.add_done_callback(lambda f: self._registrar(nombre, t0, f))
+            fut.add_done_callback(turno.soltar)
+            en_vuelo[fut] = nombre
+            proximo["cobertura"] = t0 + self.plazo(nombre)
+
+        lanzar()
+        while en_vuelo:
+            ahora = time.monotonic()
+            if ahora >= limite: break
+            espera = limite - ahora
+            if candidatos: espera = min(espera, max(0.0, proximo["cobertura"] - ahora))
+            hechos, _ = wait(list(en_vuelo), timeout=espera, return_when=FIRST_COMPLETED)
+            for fut in hechos:
+                en_vuelo.pop(fut)
+                if fut.exception() is None:
+                    for otro in en_vuelo: otro.cancel()
+                    return fut.result()
+                error = fut.exception()
+                if not es_cuota(error) and not en_vuelo: raise error
+                if candidatos and not en_vuelo: lanzar()
+            if not hechos and candidatos:
+                # El modelo se pasó de su plazo: pedido de cobertura al siguiente
+                lanzar(cobertura=True)
+        for fut in en_vuelo: fut.cancel()
+        if en_vuelo:
+            metricas().contar("ia_rechazos", motivo="timeout")
+            raise TimeoutError("la IA no respondió a tiempo")
+        raise error or ColaLlena("429: todos los modelos en pausa")
+
+    def en_cola(self):
+        return len(self._cola)
+
+# ==========================================
+# REGISTRO DE MODELOS (UNO POR PROCESO)
+# ==========================================
+def partes(contenido):
+    return list(contenido) if isinstance(contenido, (list, tuple)) else [contenido]
+
+class SesionChat:
+    """Handle liviano por sesión: solo guarda el historial. Modelos y prompt los comparte el proceso."""
+
+    def __init__(self, registro):
+        self.registro = registro
+        self.history = []
+        self.avisar = None  # callback(posición en cola) para mostrar en la UI
+        self.estado_carrito = None  # callback() -> texto con el carrito, va en el resumen
+        self.conversacion = GestorConversacion()
+
+    def _stream(self, resp, contenidos):
+        texto = ""
+        for chunk in self.registro.planificador.leer(resp):
+            texto += chunk.text
+            yield chunk
+        # El turno entra al historial recién cuando el stream terminó completo
+        self.history = contenidos + [{"role": "model", "parts": [texto]}]
+        metricas().observar("respuesta_tokens", estimar_tokens(texto))
+
+    def send_message(self, contenido, stream=False, estructurada=True):
+        nuevo = {"role": "user", "parts": partes(contenido)}
+        carrito = self.estado_carrito() if self.estado_carrito else ""
+        # Ventana de turnos recientes + resumen: el tamaño del pedido no crece con la charla
+        self.history = self.conversacion.compactar(self.history, nuevo, carrito)
+        enviar = self.conversacion.armar(self.history, nuevo, carrito)
+        metricas().observar("prompt_tokens", sum(tokens_mensaje(m) for m in enviar))
+        # Todos los modelos de la carrera reciben lo mismo; solo el ganador actualiza el historial
+        resp = self.registro.planificador.ejecutar(
+            lambda modelo: self.registro.generar(modelo, enviar, stream, estructurada), self.registro.orden(), self.avisar
+        )
+        contenidos = self.history + [nuevo]
+        if stream: return self._stream(resp, contenidos)
+        self.history = contenidos + [{"role": "model", "parts": [resp.text]}]
+        uso = getattr(resp, "usage_metadata", None)
+        metricas().observar("respuesta_tokens", getattr(uso, "candidates_token_count", 0) or estimar_tokens(resp.text))
+        return resp
+
+class RegistroModelos:
+    """Prueba una vez qué modelos responden y cachea modelos + prompt por (versión catálogo, dólar)."""
+
+    def __init__(self, modelos=MODELOS_IA, respaldo=MODELO_RESPALDO, fabrica=None):
+        self.modelos = list(modelos)
+        self.nombre_respaldo = respaldo
+        self.fabrica = fabrica or genai.GenerativeModel
+        self.disponibles = None
+        self.errores = []
+        self.api_key = None
+        self.clave = None
+        self._cache = {}
+        self._lock = threading.Lock()
+        self.planificador = Planificador()
+        self.sin_json = set()  # modelos que rechazaron la salida estructurada (se les pide texto)
+
+    def configurar(self, api_key):
+        with self._lock:
+            if api_key and api_key != self.api_key:
+                genai.configure(api_key=api_key)
+                self.api_key = api_key
+                self.disponibles = None  # con otra key hay que volver a probar
+
+    def probar(self):
+        """Disponibilidad de cada modelo (una sola vez por proceso)."""
+        with self._lock:
+            if self.disponibles is not None: return self.disponibles
+            disponibles, errores = [], []
+            for nombre in self.modelos:
+                try:
+                    info = genai.get_model(f"models/{nombre}")
+                    if "generateContent" in info.supported_generation_methods: disponibles.append(nombre)
+                    else: errores.append(f"{nombre}: sin generateContent")
+                except Exception as e:
+                    errores.append(f"{nombre}: {e}")
+            # Si no se pudo consultar ninguno (red caída), se intenta con la lista completa como antes
+            self.disponibles = disponibles or list(self.modelos)
+            self.errores = errores
+            return self.disponibles
+
+    def preparar(self, clave, construir_prompt):
+        """Deja listos prompt y modelos para esta clave. El prompt se arma solo si la clave es nueva."""
+        with self._lock:
+            if clave not in self._cache:
+                sys_prompt = construir_prompt()
+                modelos = {}
+                for nombre in dict.fromkeys((self.disponibles or self.modelos) + [self.nombre_respaldo]):
+                    try: modelos[nombre] = self.fabrica(nombre, system_instruction=sys_prompt)
+                    except Exception as e: self.errores.append(f"{nombre}: {e}")
+                self._cache[clave] = {"prompt": sys_prompt, "modelos": modelos}
+                while len(self._cache) > 2: self._cache.pop(next(iter(self._cache)))
+            self.clave = clave
+            return self._cache[clave]
+
+    def generar(self, modelo, contenidos, stream=False, estructurada=True):
+        """generate_content pidiendo JSON (mensaje + pedido); si el modelo no lo soporta o estructurada=False, texto común."""
+        nombre = getattr(modelo, "model_name", None)
+        if not (SALIDA_ESTRUCTURADA and estructurada) or nombre in self.sin_json:
+            return modelo.generate_content(contenidos, stream=stream)
+        config = genai.GenerationConfig(response_mime_type="application/json", response_schema=ESQUEMA_RESPUESTA)
+        try:
+            return modelo.generate_content(contenidos, stream=stream, generation_config=config)
+        except InvalidArgument as e:
+            # 400 por schema/mime no soportado: se recuerda y se sigue con texto (el prompt igual pide JSON)
+            self.sin_json.add(nombre)
+            metricas().contar("ia_sin_json", modelo=nombre)
+            self.errores.append(f"{nombre}: sin salida JSON ({e})")
+            return modelo.generate_content(contenidos, stream=stream)
+
+    def modelo(self, nombre=None):
+        modelos = self._cache[self.clave]["modelos"]
+        if nombre: return modelos[nombre]
+        for n in self.disponibles or self.modelos:
+            if n in modelos: return modelos[n]
+        return modelos[self.nombre_respaldo]
+
+    def orden(self):
+        # Modelos disponibles en orden de preferencia y al final el respaldo
+        modelos = self._cache[self.clave]["modelos"]
+        return [(n, modelos[n]) for n in dict.fromkeys((self.disponibles or self.modelos) + [self.nombre_respaldo]) if n in modelos]
+
+    def respaldo(self):
+        return self.modelo(self.nombre_respaldo)
+
+    def prompt(self):
+        return self._cache[self.clave]["prompt"]
+
+    def nueva_sesion(self):
+        return SesionChat(self)
+
+_registro = RegistroModelos()
+
+def registro_modelos():
+    return _registro
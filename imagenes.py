@@ -0,0 +1,91 @@
+# imagenes.py
+import io
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+from config import *
+from almacen import almacen
+
+# ==========================================
+# PREPROCESO DE FOTOS (ANTES DE MANDARLAS A LA IA)
+# ==========================================
+_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="imagenes")
+
+class FotoPreparada:
+    def __init__(self, jpeg, ancho, alto, sha, bytes_originales):
+        self.jpeg = jpeg
+        self.ancho = ancho
+        self.alto = alto
+        self.sha = sha
+        self.bytes_originales = bytes_originales
+
+    @property
+    def blob(self):
+        # Se manda el JPEG ya achicado (si se pasa la imagen PIL, la librería la sube como WebP sin pérdida)
+        return {"mime_type": "image/jpeg", "data": self.jpeg}
+
+def huella(datos):
+    # sha256 del archivo tal cual se subió: la clave del cache de respuestas
+    return hashlib.sha256(datos).hexdigest()
+
+def preprocesar(datos):
+    img = Image.open(io.BytesIO(datos))
+    img = ImageOps.exif_transpose(img)  # las fotos del celular vienen rotadas por EXIF
+    if img.mode != "RGB": img = img.convert("RGB")
+    img.thumbnail((MAX_LADO_IMAGEN, MAX_LADO_IMAGEN), Image.LANCZOS)
+    salida = io.BytesIO()
+    img.save(salida, format="JPEG", quality=CALIDAD_JPEG, optimize=True)
+    return FotoPreparada(salida.getvalue(), img.width, img.height,
+                         huella(datos), len(datos))
+
+def preprocesar_async(datos):
+    # La decodificación corre fuera del hilo del script
+    return _pool.submit(preprocesar, datos)
+
+# ==========================================
+# CACHE DE RESULTADOS POR CONTENIDO (TODO EL PROCESO)
+# ==========================================
+class CacheImagenes:
+    """LRU de respuestas por foto, solo por coincidencia exacta (sha256 del archivo).
+
+    Nada de "parecidas": dos listas escritas a mano con el mismo formato quedan a pocos
+    bits de distancia en un hash perceptual y una cotización ajena es peor que pagar la IA.
+    También van al almacén compartido, así otra réplica no vuelve a pagar la IA.
+    """
+
+    def __init__(self, maximo=CACHE_IMAGENES, compartido=None, ttl=TTL_RESPUESTAS):
+        self.maximo = maximo
+        self.compartido = compartido
+        self.ttl = ttl
+        self._items = OrderedDict()  # (sha, contexto) -> texto
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _clave(sha, contexto):
+        return "foto:" + sha + ":" + ":".join(map(str, contexto))
+
+    def buscar(self, sha, contexto):
+        with self._lock:
+            clave = (sha, contexto)
+            if clave in self._items:
+                self._items.move_to_end(clave)
+                return self._items[clave]
+        if self.compartido is None: return None
+        texto = self.compartido.obtener(self._clave(sha, contexto))
+        if texto is not None: self._recordar(sha, contexto, texto)
+        return texto
+
+    def _recordar(self, sha, contexto, texto):
+        with self._lock:
+            self._items[(sha, contexto)] = texto
+            self._items.move_to_end((sha, contexto))
+            while len(self._items) > self.maximo: self._items.popitem(last=False)
+
+    def guardar(self, sha, contexto, texto):
+        self._recordar(sha, contexto, texto)
+        if self.compartido is not None: self.compartido.guardar(self._clave(sha, contexto), texto, self.ttl)
+
+cache_imagenes = CacheImagenes(compartido=almacen())
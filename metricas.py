@@ -0,0 +1,123 @@
+# metricas.py
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from config import *
+
+# ==========================================
+# HISTOGRAMAS Y CONTADORES (TODO EL PROCESO)
+# ==========================================
+class Histograma:
+    """Conteo por rangos (como Prometheus): memoria fija aunque haya millones de mediciones."""
+
+    def __init__(self, limites):
+        self.limites = list(limites)
+        self.conteos = [0] * (len(self.limites) + 1)  # el último es +Inf
+        self.suma = 0.0
+        self.total = 0
+        self.maximo = 0.0
+
+    def observar(self, valor):
+        self.conteos[bisect.bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+        self.total += 1
+        self.maximo = max(self.maximo, valor)
+
+    def percentil(self, q):
+        # Límite superior del rango donde cae el percentil (aproximado, como histogram_quantile)
+        if not self.total: return None
+        objetivo, acumulado = q * self.total, 0
+        for i, n in enumerate(self.conteos):
+            acumulado += n
+            if acumulado >= objetivo: return min(self.limites[i], self.maximo) if i < len(self.limites) else self.maximo
+        return self.maximo
+
+    def resumen(self):
+        return {
+            "n": self.total, "prom": round(self.suma / self.total, 4) if self.total else None,
+            "p50": self.percentil(0.5), "p95": self.percentil(0.95), "p99": self.percentil(0.99), "max": round(self.maximo, 4),
+        }
+
+def _etiquetas(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+class Metricas:
+    def __init__(self):
+        self.contadores = {}   # (nombre, etiquetas) -> valor
+        self.histogramas = {}  # (nombre, etiquetas) -> Histograma
+        self.inicio = time.time()
+        self._lock = threading.Lock()
+
+    def contar(self, nombre, n=1, **labels):
+        clave = (nombre, _etiquetas(labels))
+        with self._lock: self.contadores[clave] = self.contadores.get(clave, 0) + n
+
+    def observar(self, nombre, valor, **labels):
+        clave = (nombre, _etiquetas(labels))
+        limites = LIMITES_TOKENS if nombre.endswith("_tokens") else LIMITES_SEGUNDOS
+        with self._lock:
+            if clave not in self.histogramas: self.histogramas[clave] = Histograma(limites)
+            self.histogramas[clave].observar(valor)
+
+    @contextmanager
+    def medir(self, nombre, **labels):
+        """with metricas().medir("etapa_segundos", etapa="prompt"): ..."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nombre, time.perf_counter() - t0, **labels)
+
+    def tasa(self, nombre, si="hit", no="miss"):
+        # Aciertos / total de un contador con etiqueta resultado=hit|miss (sumando el resto de etiquetas)
+        cuenta = {si: 0, no: 0}
+        with self._lock:
+            for (n, e), v in self.contadores.items():
+                resultado = dict(e).get("resultado")
+                if n == nombre and resultado in cuenta: cuenta[resultado] += v
+        total = cuenta[si] + cuenta[no]
+        return cuenta[si] / total if total else None
+
+    # --- Exportación ---
+    def filas_contadores(self):
+        with self._lock: items = sorted(self.contadores.items())
+        return [{"métrica": n, **dict(e), "valor": v} for (n, e), v in items]
+
+    def filas_histogramas(self):
+        with self._lock: items = sorted((k, h.resumen()) for k, h in self.histogramas.items())
+        return [{"métrica": n, **dict(e), **r} for (n, e), r in items]
+
+    def a_json(self):
+        return json.dumps({
+            "desde": self.inicio, "contadores": self.filas_contadores(), "histogramas": self.filas_histogramas(),
+        }, ensure_ascii=False, default=str)
+
+    def prometheus(self):
+        """Texto en formato de exposición de Prometheus (para /metrics o para bajar desde el admin)."""
+        def etiquetas(e, extra=()):
+            pares = list(e) + list(extra)
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pares) + "}" if pares else ""
+        lineas = []
+        with self._lock:
+            contadores = sorted(self.contadores.items())
+            histogramas = sorted((k, list(h.conteos), h.limites, h.suma, h.total) for k, h in self.histogramas.items())
+        vistos = set()
+        for (n, e), v in contadores:
+            if n not in vistos: lineas.append(f"# TYPE pb_{n} counter"); vistos.add(n)
+            lineas.append(f"pb_{n}_total{etiquetas(e)} {v}")
+        for (n, e), conteos, limites, suma, total in histogramas:
+            if n not in vistos: lineas.append(f"# TYPE pb_{n} histogram"); vistos.add(n)
+            acumulado = 0
+            for limite, c in zip(limites + ["+Inf"], conteos):
+                acumulado += c
+                lineas.append(f"pb_{n}_bucket{etiquetas(e, [('le', limite)])} {acumulado}")
+            lineas.append(f"pb_{n}_sum{etiquetas(e)} {suma}")
+            lineas.append(f"pb_{n}_count{etiquetas(e)} {total}")
+        return "\n".join(lineas) + "\n"
+
+_metricas = Metricas()
+
+def metricas():
+    return _metricas
@@ -0,0 +1,158 @@
+# ordenes.py
+import re
+import json
+import streamlit as st
+from config import *
+from catalogo import normalizar
+
+# ==========================================
+# RESPUESTA ESTRUCTURADA (JSON) DEL MODELO
+# ==========================================
+# Gemini escribe las claves en orden alfabético: "mensaje" sale antes que "pedido",
+# así el texto para el cliente se puede mostrar mientras llega el resto.
+ESQUEMA_RESPUESTA = {
+    "type": "object",
+    "properties": {
+        "mensaje": {"type": "string"},
+        "pedido": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "cantidad": {"type": "number"},
+                    "producto": {"type": "string"},
+                    "precio_unit": {"type": "number"},
+                    "tipo": {"type": "string"},
+                },
+                "required": ["cantidad", "producto", "precio_unit", "tipo"],
+            },
+        },
+    },
+    "required": ["mensaje"],
+}
+
+# Formato viejo (cotizador local y modelos sin JSON): [ADD:CANT:PROD:PRECIO:TIPO]
+_RE_ORDEN = re.compile(r'\[ADD:([^:\]]*):([^:\]]*):([^:\]]*):([^\]]*)\]')
+def extraer_json(texto):
+    # Acepta el JSON pelado, envuelto en ```json ... ``` o con texto alrededor: se toma el {...} más externo
+    texto = (texto or "").strip()
+    inicio, fin = texto.find("{"), texto.rfind("}")
+    if inicio < 0 or fin < inicio: return None
+    try:
+        datos = json.loads(texto[inicio:fin + 1])
+    except ValueError:
+        return None
+    return datos if isinstance(datos, dict) else None
+
+def texto_de(respuesta):
+    """Texto para el cliente: el campo "mensaje" si la respuesta es JSON, si no la respuesta tal cual."""
+    datos = extraer_json(respuesta)
+    if datos is None: return respuesta
+    return str(datos.get("mensaje", ""))
+
+def leer_items(respuesta):
+    """Ítems pedidos por el modelo (JSON o tags viejos) y los que no se pudieron leer, con el motivo."""
+    datos = extraer_json(respuesta)
+    if datos is not None: crudos = datos.get("pedido") or []
+    else: crudos = [{"cantidad": c, "producto": p, "precio_unit": u, "tipo": t} for c, p, u, t in _RE_ORDEN.findall(respuesta)]
+    items, rechazados = [], []
+    for crudo in crudos:
+        try:
+            cantidad, precio = float(crudo["cantidad"]), float(crudo["precio_unit"])
+            producto = str(crudo["producto"]).strip()
+            if cantidad <= 0 or precio <= 0 or not producto: raise ValueError("cantidad, precio o producto vacío")
+        except (KeyError, TypeError, ValueError) as e:
+            nombre = crudo.get("producto") if isinstance(crudo, dict) else None
+            rechazados.append({"item": str(nombre or crudo)[:120], "motivo": f"mal formado: {e}"})
+            continue
+        items.append({
+            "cantidad": cantidad, "producto": producto, "precio_unit": precio,
+            "subtotal": cantidad * precio, "tipo": str(crudo.get("tipo", "")).strip().upper(),
+        })
+    return items, rechazados
+
+# ==========================================
+# VALIDACIÓN CONTRA EL CATÁLOGO
+# ==========================================
+def _clave(nombre):
+    return " ".join(normalizar(nombre).split())
+
+class ValidadorPedidos:
+    """Producto por nombre normalizado -> precio en pesos del catálogo (un dict, una consulta por ítem).
+
+    Sin columna de nombre o sin ningún precio válido queda inactivo: no hay contra qué validar.
+    """
+
+    def __init__(self, indice, tabla, tolerancia=TOLERANCIA_PRECIO):
+        self.tolerancia = tolerancia
+        self.productos = {}
+        if indice.col_nombre is None: return
+        tipos = tabla[indice.col_tipo].astype(str).str.strip().str.upper() if indice.col_tipo else [""] * len(tabla)
+        for nombre, precio, tipo in zip(tabla[indice.col_nombre], tabla["PRECIO_ARS"], tipos):
+            if precio == precio: self.productos.setdefault(_clave(nombre), (str(nombre).strip(), float(precio), tipo))
+
+    @property
+    def activo(self):
+        return bool(self.productos)
+
+    def validar(self, item):
+        """(ítem corregido, None) o (None, motivo). Nombre, precio y tipo salen siempre del catálogo."""
+        encontrado = self.productos.get(_clave(item["producto"]))
+        if encontrado is None: return None, "no está en el catálogo"
+        nombre, precio, tipo = encontrado
+        corregido = dict(item, producto=nombre, precio_unit=precio, subtotal=item["cantidad"] * precio, tipo=tipo or item["tipo"])
+        # Si el modelo se equivocó de precio se anota (el cliente igual paga el del catálogo)
+        if abs(item["precio_unit"] - precio) > self.tolerancia * precio: corregido["precio_modelo"] = item["precio_unit"]
+        return corregido, None
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def obtener_validador(version, dolar, _indice, _tabla):
+    # Uno por versión de catálogo y dólar (los precios de referencia son los ya calculados en pesos)
+    return ValidadorPedidos(_indice, _tabla)
+
+# ==========================================
+# TEXTO VISIBLE MIENTRAS LLEGA EL JSON
+# ==========================================
+_ESCAPES = {"n": "\n", "t": "\t", "r": "", "b": "", "f": "", '"': '"', "\\": "\\", "/": "/"}
+_RE_INICIO_MENSAJE = re.compile(r'"mensaje"\s*:\s*"')
+
+class ExtractorMensaje:
+    """Saca el valor de "mensaje" de un JSON que llega en pedazos, a medida que se completa."""
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = None  # dónde sigue el string de "mensaje" (None: todavía no apareció)
+        self.terminado = False
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        if self.terminado: return ""
+        if self.pos is None:
+            m = _RE_INICIO_MENSAJE.search(self.buffer)
+            if not m: return ""
+            self.pos = m.end()
+        salida, i, b = [], self.pos, self.buffer
+        while i < len(b):
+            c = b[i]
+            if c == '"':
+                self.terminado = True
+                i += 1
+                break
+            if c != "\\":
+                salida.append(c); i += 1
+                continue
+            # Escape partido entre chunks: se espera al siguiente
+            if i + 1 >= len(b): break
+            if b[i + 1] != "u":
+                salida.append(_ESCAPES.get(b[i + 1], b[i + 1])); i += 2
+                continue
+            if i + 6 > len(b): break
+            cp = int(b[i + 2:i + 6], 16)
+            if 0xD800 <= cp < 0xDC00:
+                # Emoji como par sustituto: 🔥
+                if i + 12 > len(b): break
+                cp = 0x10000 + ((cp - 0xD800) << 10) + (int(b[i + 8:i + 12], 16) - 0xDC00)
+                i += 6
+            salida.append(chr(cp)); i += 6
+        self.pos = i
+        return "".join(salida)
@@ -0,0 +1,117 @@
+# precios.py
+import functools
+from collections import Counter
+from config import *
+
+# ==========================================
+# CARRITO CON TOTALES AL DÍA
+# ==========================================
+@functools.lru_cache(maxsize=512)
+def categorias_de(tipo):
+    """Categorías de descuento a las que pertenece un tipo de producto."""
+    tipo = str(tipo).upper()
+    return tuple(c for c, (modo, palabras) in CATEGORIAS_CARRITO.items()
+                 if (tipo in palabras if modo == "igual" else any(p in tipo for p in palabras)))
+
+class Carrito:
+    """Lista de ítems que mantiene subtotal y conteo por categoría en cada alta/cambio/baja.
+
+    Se usa como la lista de antes (append, len, iterar, índice) pero el precio sale de los totales.
+    `revision` cambia con cada modificación (para saber si hay que volver a guardarlo).
+    """
+
+    def __init__(self, items=()):
+        self._items = []
+        self.subtotal = 0.0
+        self.categorias = Counter()
+        self.revision = 0
+        for item in items: self.agregar(item)
+        self.revision = 0
+
+    def _sumar(self, item, signo):
+        self.subtotal += signo * item['subtotal']
+        for c in categorias_de(item['tipo']): self.categorias[c] += signo
+        if not self._items:
+            # Sin ítems no quedan restos de redondeo
+            self.subtotal = 0.0
+            self.categorias.clear()
+
+    def agregar(self, item):
+        self._items.append(item)
+        self._sumar(item, 1)
+        self.revision += 1
+
+    append = agregar
+
+    def actualizar(self, i, cantidad):
+        viejo = self._items[i]
+        if not cantidad or cantidad <= 0: return self.quitar(i)
+        nuevo = dict(viejo, cantidad=cantidad, subtotal=cantidad * viejo['precio_unit'])
+        self._items[i] = nuevo
+        self.subtotal += nuevo['subtotal'] - viejo['subtotal']
+        self.revision += 1
+
+    def quitar(self, i):
+        item = self._items.pop(i)
+        self._sumar(item, -1)
+        self.revision += 1
+
+    def vaciar(self):
+        self._items.clear()
+        self.subtotal = 0.0
+        self.categorias.clear()
+        self.revision += 1
+
+    def tiene(self, categoria):
+        return self.categorias[categoria] > 0
+
+    def __len__(self): return len(self._items)
+    def __iter__(self): return iter(self._items)
+    def __getitem__(self, i): return self._items[i]
+    def __bool__(self): return bool(self._items)
+    def __repr__(self): return repr(self._items)
+
+# ==========================================
+# MOTOR DE DESCUENTOS (TABLA DE REGLAS)
+# ==========================================
+class Precio:
+    def __init__(self, bruto, descuento, nivel, color, meta):
+        self.bruto = bruto
+        self.descuento = descuento
+        self.nivel = nivel
+        self.color = color
+        self.meta = meta
+        self.neto = bruto * (1 - descuento / 100)
+        self.ahorro = bruto - self.neto
+
+def evaluar(subtotal, categorias, activa=True, niveles=NIVELES_DESCUENTO, boosters=BOOSTERS_DESCUENTO, tope=TOPE_DESCUENTO):
+    """Descuento para un subtotal y un conjunto de categorías presentes. No toca el carrito.
+
+    Las reglas se pueden pasar aparte para simular escenarios.
+    """
+    if not activa: return Precio(subtotal, 0, "EXPIRADO", "#455a64", META_BASE)
+    meta = 0
+    for umbral, desc, nivel, color in niveles:
+        if umbral is None or subtotal > umbral: break
+        meta = umbral
+    extra = 0
+    for nombre, requeridas, pct in boosters:
+        if all(c in categorias for c in requeridas):
+            extra = pct
+            break
+    total = min(desc + extra, tope)
+    if extra > 0:
+        nivel = f"{nivel} + {nombre}"
+        if total >= COLOR_DESCUENTO_ALTO[0]: color = COLOR_DESCUENTO_ALTO[1]
+    return Precio(subtotal, total, nivel, color, meta)
+
+def precio_carrito(carrito, activa=True):
+    return evaluar(carrito.subtotal, {c for c, n in carrito.categorias.items() if n > 0}, activa)
+
+def cotizar_lote(items, activa=True, **reglas):
+    """Precio de una lista de pedido importada entera (ítems como los del carrito)."""
+    subtotal, categorias = 0.0, set()
+    for item in items:
+        subtotal += item['subtotal']
+        categorias.update(categorias_de(item['tipo']))
+    return evaluar(subtotal, categorias, activa, **reglas)
@@ -0,0 +1,110 @@
+# tests/test_catalogo.py
+import re
+import math
+import random
+import pandas as pd
+import pytest
+from almacen import AlmacenMemoria
+from bench.falso import PlanillaLocal, catalogo_sintetico
+from catalogo import a_numeros, columna_precio, en_dolares, tabla_precios, ServicioCatalogo
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("12500", 12500.0),
+    ("12500.5", 12500.5),
+    ("12500,5", 12500.5),
+    ("$ 12.500,50", 12500.5),
+    ("12,500.50", 12500.5),
+    ("12,500", 12500.0),
+    ("1,234,567", 1234567.0),
+    ("12.500", 12500.0),
+    ("1.234.567", 1234567.0),
+    ("12.50", 12.5),
+    ("0,75", 0.75),
+    ("U$S 3.25", 3.25),
+    ("USD 1.250,00", 1250.0),
+    ("", None),
+    ("consultar", None),
+    ("1.2.3,4,5", None),
+])
+def test_a_numeros_tabla(texto, esperado):
+    valor = a_numeros(pd.Series([texto]))[0]
+    if esperado is None: assert math.isnan(valor)
+    else: assert valor == pytest.approx(esperado)
+
+def a_numero_viejo(valor):
+    # El conversor de a una celda que reemplazó a_numeros (cotizador.py, antes de precalcular precios)
+    s = re.sub(r"[^\d.,]", "", str(valor))
+    if not s: return None
+    if "," in s and "." in s:
+        s = s.replace(".", "").replace(",", ".") if s.rfind(",") > s.rfind(".") else s.replace(",", "")
+    elif "," in s:
+        s = s.replace(",", "") if re.fullmatch(r"\d{1,3}(,\d{3})+", s) else s.replace(",", ".")
+    elif re.fullmatch(r"\d{1,3}(\.\d{3})+", s):
+        s = s.replace(".", "")
+    try: return float(s)
+    except ValueError: return None
+
+def test_a_numeros_igual_al_conversor_viejo():
+    azar = random.Random(0)
+    textos = ["".join(azar.choice("0123456789.,$ U") for _ in range(azar.randint(0, 12))) for _ in range(5000)]
+    for texto, valor in zip(textos, a_numeros(pd.Series(textos))):
+        viejo = a_numero_viejo(texto)
+        if viejo is None: assert math.isnan(valor), texto
+        else: assert valor == pytest.approx(viejo), texto
+
+def test_columna_precio_configurada_o_por_prioridad():
+    df = pd.DataFrame({"PRODUCTO": ["A"], "COSTO": ["5"], "PRECIO": ["10"]})
+    assert columna_precio(df, "") == "PRECIO"  # PRECIO gana a COSTO aunque esté a la derecha
+    assert columna_precio(df, "COSTO") == "COSTO"
+    assert columna_precio(df, "NO EXISTE") == "PRECIO"
+
+@pytest.mark.parametrize("columna, moneda, esperado", [
+    ("PRECIO", "USD", True), ("PRECIO USD", "ARS", False),
+    ("PRECIO USD", "", True), ("PRECIO", "", False),
+])
+def test_moneda_explicita_antes_que_el_encabezado(columna, moneda, esperado):
+    assert en_dolares(columna, moneda) is esperado
+
+def test_tabla_precios_en_pesos_con_iva():
+    df = pd.DataFrame({"PRODUCTO": ["A", "B"], "PRECIO": ["2,5", "x"]})
+    tabla = tabla_precios(df, 1000.0)
+    assert tabla["PRECIO_ARS"][0] == pytest.approx(2500.0 if en_dolares("PRECIO") else 2.5)
+    assert math.isnan(tabla["PRECIO_ARS"][1])
+
+# ==========================================
+# COPIA COMPARTIDA ENTRE RÉPLICAS
+# ==========================================
+class AlmacenContado(AlmacenMemoria):
+    """Almacén en memoria que anota qué claves se leen y se escriben."""
+
+    def __init__(self):
+        super().__init__(prefijo="")
+        self.leidas, self.escritas = [], []
+
+    def _obtener(self, clave):
+        self.leidas.append(clave)
+        return super()._obtener(clave)
+
+    def _guardar(self, clave, valor, ttl):
+        self.escritas.append(clave)
+        super()._guardar(clave, valor, ttl)
+
+def test_revalidar_sin_cambios_no_mueve_el_csv():
+    planilla = PlanillaLocal(catalogo_sintetico(50))
+    try:
+        compartido = AlmacenContado()
+        a = ServicioCatalogo(planilla.url, ttl=0, compartido=compartido)
+        assert a.refrescar() and a.csv
+        assert compartido.escritas == ["catalogo:csv", "catalogo:ficha"]
+        # Otra réplica adopta la copia sin bajarla
+        b = ServicioCatalogo("http://127.0.0.1:1/", compartido=compartido)
+        assert b.version == a.version and b.csv == a.csv
+        # 304: solo se renueva la ficha, y la otra réplica la adopta sin leer el CSV
+        compartido.leidas.clear(); compartido.escritas.clear()
+        a.refrescar()
+        assert compartido.escritas == ["catalogo:ficha"]
+        compartido.leidas.clear()
+        assert b._cargar_snapshot()
+        assert compartido.leidas == ["catalogo:ficha"]
+    finally:
+        planilla.cerrar()
@@ -0,0 +1,51 @@
+# tests/test_flete.py
+import pytest
+from flete import es_pregunta_flete, responder_flete, contexto_flete, menciona_flete, indice_localidades
+
+# Lo que en el catálogo real responde indice.filas_con(token)
+PRODUCTOS = {"CHAPA", "CHAPAS", "HIERRO", "HIERROS", "PERFIL", "PERFILES"}
+es_producto = PRODUCTOS.__contains__
+DOLAR = 1000.0
+
+def localidades(texto):
+    return [nombre for nombre, _ in indice_localidades.buscar_todas(texto)]
+
+@pytest.mark.parametrize("texto, esperada", [
+    ("cuanto sale el flete a rafaela", "RAFAELA"),
+    ("cuanto sale el flete a rafela", "RAFAELA"),
+    ("envio a cordova", "CORDOBA"),
+    ("flete a sunchale", "SUNCHALES"),
+    ("hacen envios a casas?", "CASAS"),
+    ("cuanto sale el envio a san martin de las escobas", "SAN MARTIN DE LAS ESCOBAS"),
+])
+def test_pregunta_de_flete_sola(texto, esperada):
+    assert es_pregunta_flete(texto, es_producto)
+    assert localidades(texto) == [esperada]
+
+@pytest.mark.parametrize("texto", ["¿hacen envío a mi casa?", "envio a la capital"])
+def test_sin_localidad_no_se_inventa_una(texto):
+    # "CASA" no es "CASAS" y "la capital" no es Córdoba: que conteste la IA
+    assert localidades(texto) == []
+    assert responder_flete(texto, DOLAR, es_producto) is None
+
+@pytest.mark.parametrize("texto, esperada", [
+    ("flete para 20 chapas a rafaela", "RAFAELA"),
+    ("llevan a san jorge 30 hierros del 8", "SAN JORGE"),
+    ("50 hierros, envio a rafaela", "RAFAELA"),
+])
+def test_pedido_con_envio_va_a_la_ia_con_el_flete(texto, esperada):
+    # No se contesta solo el flete (se perdería el pedido); la IA recibe el costo en el contexto
+    assert not es_pregunta_flete(texto, es_producto)
+    assert responder_flete(texto, DOLAR, es_producto) is None
+    assert menciona_flete(texto)
+    assert contexto_flete(texto, DOLAR).startswith(f"FLETE {esperada}:")
+
+def test_producto_sin_cantidad_tambien_es_pedido():
+    assert not es_pregunta_flete("flete para chapas a rafaela", es_producto)
+
+def test_varias_localidades_en_un_mensaje():
+    texto = "flete a esperanza y cuanto a rafaela"
+    assert localidades(texto) == ["ESPERANZA", "RAFAELA"]
+    respuesta = responder_flete(texto, DOLAR, es_producto)
+    assert "ESPERANZA" in respuesta and "RAFAELA" in respuesta
+    assert len(contexto_flete(texto, DOLAR).splitlines()) == 2
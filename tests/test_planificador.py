@@ -0,0 +1,61 @@
+# tests/test_planificador.py
+import time
+import threading
+from types import SimpleNamespace
+import pytest
+import ia
+from bench.falso import PerfilModelo, ModeloFalso
+
+def modelos(latencia=0.0, ttft=0.0):
+    perfil = PerfilModelo(latencia=latencia, ttft=ttft, variacion=0, chunk=8, pausa_chunk=0)
+    return [(n, ModeloFalso(n, perfil=perfil)) for n in ("principal", "respaldo")]
+
+def llamada(modelo):
+    return modelo.generate_content(["hola"])
+
+def test_cobertura_sin_cupo_no_gira_en_vacio(monkeypatch):
+    # Bucket vacío tras el primer pedido: la cobertura no se puede lanzar y el turno espera sin quemar CPU
+    p = ia.Planificador(max_concurrentes=2, max_cola=5, espera_max=5)
+    p.bucket = ia.TokenBucket(1, 1)
+    p.plazo = lambda nombre: 0.05
+    llamadas_wait = []
+    original = ia.wait
+    monkeypatch.setattr(ia, "wait", lambda *a, **kw: llamadas_wait.append(1) or original(*a, **kw))
+    cpu = time.process_time()
+    resp = p.ejecutar(llamada, modelos(latencia=0.6))
+    assert resp.text.startswith("Dale")
+    assert len(llamadas_wait) < 50
+    assert time.process_time() - cpu < 0.3
+
+def test_llamada_colgada_ocupa_su_lugar_hasta_terminar(monkeypatch):
+    monkeypatch.setattr(ia, "TIMEOUT_IA", 0.2)
+    p = ia.Planificador(max_concurrentes=1, max_cola=5, espera_max=5)
+    p.plazo = lambda nombre: 10
+    with pytest.raises(TimeoutError):
+        p.ejecutar(llamada, modelos(latencia=0.6)[:1])
+    assert p._en_curso == 1  # la llamada sigue en vuelo: el lugar no se reparte todavía
+    time.sleep(0.7)
+    assert p._en_curso == 0
+
+def colgado():
+    # Manda un pedazo y se queda mudo (como un stream que la red dejó a medias)
+    yield SimpleNamespace(text="{")
+    threading.Event().wait(5)
+
+def consumir(stream):
+    with pytest.raises(TimeoutError):
+        for _ in stream: pass
+
+def test_stream_colgado_corta_y_no_frena_a_los_demas():
+    p = ia.Planificador()
+    colgados = [p.leer(colgado(), plazo=0.1) for _ in range(40)]
+    for c in colgados: next(c)
+    hilos = [threading.Thread(target=consumir, args=(c,)) for c in colgados]
+    for h in hilos: h.start()
+    for h in hilos: h.join()
+    # Con todos los anteriores colgados, un stream sano se lee entero y enseguida
+    _, modelo = modelos(ttft=0.0)[0]
+    t0 = time.monotonic()
+    texto = "".join(c.text for c in p.leer(modelo.generate_content(["hola"], stream=True), plazo=0.5))
+    assert texto.startswith("Dale")
+    assert time.monotonic() - t0 < 0.5
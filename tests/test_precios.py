@@ -0,0 +1,65 @@
+# tests/test_precios.py
+import random
+import pytest
+from config import META_MAXIMA, META_MEDIA, META_BASE
+from precios import Carrito, evaluar, precio_carrito, cotizar_lote
+
+TIPOS = ["HIERRO", "MALLA", "CLAVOS", "ALAMBRE", "PERFIL", "CHAPA", "TUBO", "CAÑO", "PINTURA",
+         "ACCESORIO", "ELECTRODO", "CHAPA ACANALADA", "PERFIL C", "PINTURA LATEX", "OTRO", ""]
+
+def descuento_viejo(items, activa):
+    # El if/elif de calcular_negocio antes de la tabla de reglas: (descuento, nivel, color, meta)
+    bruto = sum(i['subtotal'] for i in items)
+    meta = META_BASE
+    tipos = [x['tipo'] for x in items]
+    tiene_chapa = any("CHAPA" in t for t in tipos)
+    tiene_perfil = any("PERFIL" in t for t in tipos)
+    tiene_acero = any(t in ["HIERRO", "MALLA", "CLAVOS", "ALAMBRE", "PERFIL", "CHAPA", "TUBO", "CAÑO"] for t in tipos)
+    tiene_pintura = any("PINTURA" in t or "ACCESORIO" in t or "ELECTRODO" in t for t in tipos)
+    if not activa: return 0, "EXPIRADO", "#455a64", meta
+    if bruto > META_MAXIMA: desc_base = 15; nivel = "PARTNER MAX"; color = "#6200ea"; meta = 0
+    elif bruto > META_MEDIA: desc_base = 12; nivel = "CONSTRUCTOR"; color = "#d32f2f"; meta = META_MAXIMA
+    elif bruto > META_BASE: desc_base = 10; nivel = "OBRA"; color = "#f57c00"; meta = META_MEDIA
+    else: desc_base = 3; nivel = "CONTADO"; color = "#2e7d32"; meta = META_BASE
+    desc_extra, boosters = 0, []
+    if tiene_chapa and tiene_perfil: desc_extra += 3; boosters.append("KIT TECHO")
+    elif tiene_acero and tiene_pintura: desc_extra += 2; boosters.append("PACK TERM.")
+    total = min(desc_base + desc_extra, 18)
+    if desc_extra > 0:
+        nivel = f"{nivel} + {' '.join(boosters)}"
+        if total >= 15: color = "#6200ea"
+    return total, nivel, color, meta
+
+def item(azar):
+    cantidad, precio = azar.randint(1, 60), azar.choice([1500.0, 8000.0, 45000.0, 120000.0, 900000.0])
+    return {"cantidad": cantidad, "producto": "X", "precio_unit": precio, "subtotal": cantidad * precio,
+            "tipo": azar.choice(TIPOS)}
+
+@pytest.mark.parametrize("semilla", range(4))
+def test_tabla_de_reglas_igual_al_if_elif_viejo(semilla):
+    azar = random.Random(semilla)
+    for _ in range(500):
+        carrito = Carrito(item(azar) for _ in range(azar.randint(0, 8)))
+        # Altas, cambios y bajas: los totales al día tienen que seguir coincidiendo con recorrer la lista
+        for _ in range(azar.randint(0, 4)):
+            if carrito and azar.random() < 0.5: carrito.actualizar(azar.randrange(len(carrito)), azar.randint(0, 30))
+            elif carrito: carrito.quitar(azar.randrange(len(carrito)))
+            else: carrito.agregar(item(azar))
+        activa = azar.random() < 0.9
+        precio = precio_carrito(carrito, activa)
+        assert (precio.descuento, precio.nivel, precio.color, precio.meta) == descuento_viejo(list(carrito), activa)
+        assert precio.bruto == pytest.approx(sum(i['subtotal'] for i in carrito))
+        lote = cotizar_lote(list(carrito), activa)
+        assert (lote.descuento, lote.nivel) == (precio.descuento, precio.nivel)
+
+@pytest.mark.parametrize("subtotal, descuento, meta", [
+    (0, 3, META_BASE), (META_BASE, 3, META_BASE), (META_BASE + 1, 10, META_MEDIA),
+    (META_MEDIA + 1, 12, META_MAXIMA), (META_MAXIMA + 1, 15, 0),
+])
+def test_bordes_de_los_niveles(subtotal, descuento, meta):
+    precio = evaluar(subtotal, set())
+    assert (precio.descuento, precio.meta) == (descuento, meta)
+
+def test_tope_con_booster():
+    precio = evaluar(META_MAXIMA + 1, {"CHAPA", "PERFIL", "ACERO"})
+    assert precio.descuento == 18 and precio.nivel == "PARTNER MAX + KIT TECHO"
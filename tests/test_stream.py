@@ -0,0 +1,66 @@
+# tests/test_stream.py
+from types import SimpleNamespace
+import pytest
+import funciones
+from config import AVISO_CORTE
+from funciones import RespuestaStream, FiltroVisible, limpiar_visible
+from ordenes import ExtractorMensaje
+
+class ChatCortado:
+    """Manda unos pedazos del JSON y se corta (como el TimeoutError por pedazo del planificador)."""
+
+    def __init__(self, pedazos):
+        self.pedazos = pedazos
+
+    def send_message(self, prompt, stream=False):
+        for p in self.pedazos: yield SimpleNamespace(text=p)
+        raise TimeoutError("la IA dejó de responder a mitad de la respuesta")
+
+def test_respuesta_cortada_avisa_y_no_deja_el_json_a_medias(monkeypatch):
+    monkeypatch.setattr(funciones, "armar_prompt", lambda contenido: contenido)
+    stream = RespuestaStream(ChatCortado(['{"mensaje": "Te sumo 10 hierros', ' del 8 al pedido", "pedido": [{"cant']), "10 hierros del 8")
+    visible = "".join(stream)
+    assert visible.startswith("Te sumo 10 hierros del 8 al pedido")
+    assert visible.endswith(AVISO_CORTE)
+    assert stream.cortada
+    assert stream.texto == AVISO_CORTE  # lo que se guarda y se parsea es el aviso, no el JSON roto
+
+# ==========================================
+# JSON QUE LLEGA EN PEDAZOS
+# ==========================================
+RESPUESTA_JSON = '```json\n{"mensaje": "Te sumo 10 \\"hierros\\" del 8\\nListo \\ud83d\\udd25 \\u00f1", "pedido": [{"cantidad": 10}]}\n```'
+MENSAJE = 'Te sumo 10 "hierros" del 8\nListo 🔥 ñ'
+
+def en_pedazos(texto, tamano):
+    return [texto[i:i + tamano] for i in range(0, len(texto), tamano)]
+
+@pytest.mark.parametrize("tamano", [1, 2, 3, 5, 7, 13, 1000])
+def test_extractor_con_cualquier_corte(tamano):
+    extractor = ExtractorMensaje()
+    assert "".join(extractor.feed(p) for p in en_pedazos(RESPUESTA_JSON, tamano)) == MENSAJE
+    assert extractor.terminado
+
+@pytest.mark.parametrize("tamano", [1, 4, 1000])
+def test_filtro_json_solo_deja_pasar_el_mensaje(tamano):
+    filtro = FiltroVisible()
+    visible = "".join(filtro.feed(p) for p in en_pedazos(RESPUESTA_JSON, tamano)) + filtro.cerrar()
+    assert visible == MENSAJE
+
+@pytest.mark.parametrize("texto", ["`hierro` del 8 sale $8000", "{sin json} el hierro del 8 sale $8000"])
+def test_texto_que_empieza_como_json_igual_se_muestra(texto):
+    # Modelos sin salida JSON: si nunca aparece "mensaje", al cerrar sale el texto
+    filtro = FiltroVisible()
+    visible = "".join(filtro.feed(p) for p in en_pedazos(texto, 3)) + filtro.cerrar()
+    assert visible == texto
+
+# ==========================================
+# TAGS Y MARCAS PARTIDOS ENTRE PEDAZOS
+# ==========================================
+RESPUESTA_TAGS = "[TEXTO VISIBLE] Dale, te sumo los hierros [precio lista].\nSALIDA: listo\n[ADD:10:HIERRO ADN 8MM:8000:HIERRO][ADD:2:CLAVOS 2:900:CLAVOS]"
+
+@pytest.mark.parametrize("tamano", [1, 2, 3, 5, 8, 1000])
+def test_filtro_tags_igual_que_limpiar_de_una(tamano):
+    filtro = FiltroVisible()
+    visibles = [filtro.feed(p) for p in en_pedazos(RESPUESTA_TAGS, tamano)] + [filtro.cerrar()]
+    assert "".join(visibles) == limpiar_visible(RESPUESTA_TAGS)
+    assert not any("[ADD" in v or "SALIDA" in v for v in visibles)